@@ -35,6 +35,7 @@ class EndDevice:
         """
         self.ip_address = ""
         self.packets = []
+        self.router = None
 
     def get_ip_address(self) -> str:
         """Return the current IP address of the device."""
@@ -45,7 +46,10 @@ class EndDevice:
         Set an IP address for the device.
 
         You don't need to validate the IP address here.
+        If the device is connected to a router, the router's IP index is updated as well.
         """
+        if self.router is not None:
+            self.router.update_device_ip(self, self.ip_address, ip_address)
         self.ip_address = ip_address
 
     def add_packet(self, packet: Packet) -> None:
@@ -94,6 +98,7 @@ class Router:
         self.ip_address = self.ip_address if self.ip_list[-1] == "1" else "192.168.0.1"
 
         self.devices = []
+        self.devices_by_ip = {}
 
     def get_ip_address(self) -> str:
         """Return the current IP address of the router."""
@@ -132,16 +137,24 @@ class Router:
         Add end device to router.
 
         The same device can not be added twice.
+        A device connected to another router must be removed from it first.
         Each device should be assigned an unique IP address in the correct subnet.
 
         The method should return True if device was added, else False.
         """
-        if device in self.devices:
+        # A device belongs to one router at a time; the back-reference makes this check O(1)
+        if device.router is not None:
             return False
-        else:
-            device.set_ip_address(self.generate_ip_address())
-            self.devices.append(device)
-            return True
+        # A full subnet raises here, before the device is connected
+        ip_address = self.generate_ip_address()
+        device.router = self
+        try:
+            device.set_ip_address(ip_address)
+        except Exception:
+            device.router = None
+            raise
+        self.devices.append(device)
+        return True
 
     def remove_device(self, device: EndDevice) -> bool:
         """
@@ -155,6 +168,7 @@ class Router:
         for index, dev_from_list in enumerate(self.devices):
             if dev_from_list == device:
                 dev_from_list.set_ip_address("")
+                dev_from_list.router = None
                 del self.devices[index]
                 return True
         else:
@@ -171,12 +185,19 @@ class Router:
         If there is no device with given IP, then return None.
         Otherwise return the found device.
         """
-        device_ip_list = map(lambda device: device.get_ip_address(), self.devices)  # can use filter but I already did this....
-        for index, ip_from_list in enumerate(device_ip_list):
-            if ip_from_list == ip:
-                return self.devices[index]
-        else:
-            return None
+        return self.devices_by_ip.get(ip)
+
+    def update_device_ip(self, device: EndDevice, old_ip: str, new_ip: str) -> None:
+        """
+        Move a device to its new IP in the router's IP index.
+
+        Called by EndDevice.set_ip_address, so the index always matches the devices' IPs.
+        An empty IP means the device has no address and is not indexed.
+        """
+        if self.devices_by_ip.get(old_ip) is device:
+            del self.devices_by_ip[old_ip]
+        if new_ip:
+            self.devices_by_ip[new_ip] = device
 
     def receive_packet(self, packet: Packet) -> None:
         """
@@ -0,0 +1,401 @@
+"""Benchmark the network simulation."""
+
+import asyncio
+import os
+import random
+import re
+import tempfile
+import time
+import tracemalloc
+
+from router import Packet
+from server import EndDevicePlus, RouterPlus, Server
+from capture import PacketRecorder, replay
+from ipv4 import parse_many
+from lossy_link import LossyLink
+from sharding import ShardedServer
+from simulation import AsyncNetwork
+
+
+def full_router(ip_address: str = "192.168.1.1") -> RouterPlus:
+    """Create a router with all 253 hosts of its subnet connected."""
+    router = RouterPlus(ip_address)
+    for _ in range(253):
+        router.add_device(EndDevicePlus())
+    return router
+
+
+def bench_router_delivery(packet_count: int = 1_000_000) -> float:
+    """
+    Push packets through a router holding all 253 hosts.
+
+    Packets are addressed round-robin to every device of the router.
+    Return the number of delivered packets per second.
+    """
+    router = full_router()
+    ips = [device.get_ip_address() for device in router.get_devices()]
+    packets = [Packet("hello", "1.2.3.4", ips[i % len(ips)], 1, i) for i in range(packet_count)]
+
+    start = time.perf_counter()
+    for packet in packets:
+        router.receive_packet(packet)
+    elapsed = time.perf_counter() - start
+
+    return packet_count / elapsed
+
+
+def bench_get_message(message_count: int = 5_000, pieces: int = 20) -> float:
+    """
+    Reassemble thousands of interleaved messages on one device.
+
+    Every message is split into pieces that arrive shuffled together with the pieces of all other messages.
+    Return the number of reassembled messages per second.
+    """
+    device = EndDevicePlus()
+    packets = [Packet("hello", "1.2.3.4", "192.168.1.2", id, sequence_number)
+               for id in range(message_count) for sequence_number in range(1, pieces + 1)]
+    random.Random(12).shuffle(packets)
+    for packet in packets:
+        device.add_packet(packet)
+
+    start = time.perf_counter()
+    for id in range(message_count):
+        device.get_message(id)
+    elapsed = time.perf_counter() - start
+
+    return message_count / elapsed
+
+
+def server_with_routers(router_count: int) -> tuple[Server, list[str]]:
+    """Create a server with router_count routers that have one device each and return it with the devices' IPs."""
+    server = Server()
+    server.set_ip_address("1.2.3.4")
+    ips = []
+    for i in range(router_count):
+        router = RouterPlus(f"10.{i // 256}.{i % 256}.1")
+        device = EndDevicePlus()
+        router.add_device(device)
+        server.add_router(router)
+        ips.append(device.get_ip_address())
+    return server, ips
+
+
+def bench_server_routing(router_count: int = 500, packet_count: int = 1_000_000) -> float:
+    """
+    Route packets through a server fronting hundreds of routers.
+
+    Every router has one device and packets are addressed round-robin to all of them.
+    Return the number of routed packets per second.
+    """
+    server, ips = server_with_routers(router_count)
+    packets = [Packet("hello", "1.2.3.4", ips[i % len(ips)], 1, i) for i in range(packet_count)]
+
+    start = time.perf_counter()
+    for packet in packets:
+        server.send_packet_to_ip(packet)
+    elapsed = time.perf_counter() - start
+
+    return packet_count / elapsed
+
+
+def bench_send_messages(router_count: int = 500, message_count: int = 100_000) -> tuple[float, float]:
+    """
+    Compare sending messages one by one with send_message_to_ip() against one send_messages() batch.
+
+    Every message is 100 characters long, so it is split into 20 packets.
+    Return the number of sent packets per second for both paths.
+    """
+    message = "x" * 100
+    packet_count = message_count * 20
+    results = []
+    for batched in (False, True):
+        server, ips = server_with_routers(router_count)
+        batch = [(message, ips[i % len(ips)], i) for i in range(message_count)]
+
+        start = time.perf_counter()
+        if batched:
+            server.send_messages(batch)
+        else:
+            for text, ip_address, id in batch:
+                server.send_message_to_ip(text, ip_address, id)
+        elapsed = time.perf_counter() - start
+
+        results.append(packet_count / elapsed)
+
+    return results[0], results[1]
+
+
+def bench_send_message_to_all(router_count: int = 20, message_count: int = 200) -> float:
+    """
+    Broadcast messages to full subnets.
+
+    Every router holds all 253 hosts and every message is split into 20 packets.
+    Return the number of delivered packets (counted per device) per second.
+    """
+    server = Server()
+    server.set_ip_address("1.2.3.4")
+    for i in range(router_count):
+        server.add_router(full_router(f"10.0.{i}.1"))
+    message = "x" * 100
+
+    start = time.perf_counter()
+    for id in range(message_count):
+        server.send_message_to_all(message, id)
+    elapsed = time.perf_counter() - start
+
+    return router_count * 253 * message_count * 20 / elapsed
+
+
+def bench_async_flows(router_count: int = 10, flow_count: int = 2_000) -> dict:
+    """
+    Run thousands of concurrent message flows through the asyncio simulation.
+
+    Links have 1 ms latency and queues hold 100 packets, so senders are slowed down by backpressure.
+    Return the end-to-end latency distribution and the number of delivered packets per second.
+    """
+    async def run() -> dict:
+        server = Server()
+        server.set_ip_address("1.2.3.4")
+        ips = []
+        for i in range(router_count):
+            router = full_router(f"10.0.{i}.1")
+            server.add_router(router)
+            ips.extend(device.get_ip_address() for device in router.get_devices())
+
+        start = time.perf_counter()
+        async with AsyncNetwork(server, latency=0.001, queue_size=100) as network:
+            await asyncio.gather(*(network.send_message_to_ip("x" * 100, ips[i % len(ips)], i) for i in range(flow_count)))
+        elapsed = time.perf_counter() - start
+
+        stats = network.get_latency_stats()
+        stats["packets_per_second"] = stats["delivered"] / elapsed
+        return stats
+
+    return asyncio.run(run())
+
+
+def bench_lossy_reassembly(loss: float, message_count: int = 50_000) -> float:
+    """
+    Send messages over a lossy, reordering and duplicating link and reassemble them.
+
+    Packets are lost with the given probability, reordered with the same probability and duplicated half as often.
+    Devices drop duplicates on arrival.
+    Return the number of sent and reassembled messages per second.
+    """
+    router = full_router()
+    for device in router.get_devices():
+        device.drop_duplicates = True
+    devices = router.get_devices()
+    server = Server()
+    server.set_ip_address("1.2.3.4")
+    server.add_router(router)
+    server.set_link(LossyLink(loss=loss, reorder=loss, duplicate=loss / 2, seed=12))
+    batch = [("x" * 100, devices[i % len(devices)].get_ip_address(), i) for i in range(message_count)]
+
+    start = time.perf_counter()
+    server.send_messages(batch)
+    server.link.flush()
+    for i in range(message_count):
+        devices[i % len(devices)].get_message(i)
+    elapsed = time.perf_counter() - start
+
+    return message_count / elapsed
+
+
+def bench_ipv4_parsing(address_count: int = 10_000_000) -> tuple[float, float]:
+    """
+    Compare the old regex validation followed by splitting with ipv4.parse_many().
+
+    The addresses are drawn from 100 000 random IPs, one in ten of them invalid.
+    Return the number of parsed addresses per second for both paths.
+    """
+    rng = random.Random(12)
+    pool = [".".join(str(rng.randrange(300 if i % 10 == 0 else 256)) for _ in range(4)) for i in range(100_000)]
+    addresses = [pool[i % len(pool)] for i in range(address_count)]
+    pattern_ip = r"((\d|[1-9]\d|1\d\d|2[0-4]\d|25[0-5])\.(\d|[1-9]\d|1\d\d|2[0-4]\d|25[0-5])\.(\d|[1-9]\d|1\d\d|2[0-4]\d|25[0-5])\.(\d|[1-9]\d|1\d\d|2[0-4]\d|25[0-5]))"
+
+    def regex_path() -> list[int | None]:
+        values = []
+        for ip_address in addresses:
+            if re.fullmatch(pattern_ip, ip_address) is None:
+                values.append(None)
+            else:
+                a, b, c, d = map(int, ip_address.split("."))
+                values.append(a << 24 | b << 16 | c << 8 | d)
+        return values
+
+    results = []
+    for parse in (regex_path, lambda: parse_many(addresses)):
+        start = time.perf_counter()
+        parse()
+        results.append(address_count / (time.perf_counter() - start))
+
+    return results[0], results[1]
+
+
+def bench_sharded_send_message_to_all(router_count: int = 2_000, shard_counts: tuple = (1, 2, 4),
+                                      message_count: int = 20) -> dict:
+    """
+    Broadcast messages to thousands of subnets, in one process and sharded over worker processes.
+
+    Every router has 10 devices and every message is split into 20 packets.
+    Return the number of delivered packets (counted per device) per second for each shard count,
+    with 0 shards meaning the plain single-process Server.
+    """
+    server = Server()
+    server.set_ip_address("1.2.3.4")
+    for i in range(router_count):
+        router = RouterPlus(f"10.{i // 256}.{i % 256}.1")
+        for _ in range(10):
+            router.add_device(EndDevicePlus())
+        server.add_router(router)
+    message = "x" * 100
+    delivered = router_count * 10 * message_count * 20
+
+    results = {}
+    start = time.perf_counter()
+    for id in range(message_count):
+        server.send_message_to_all(message, id)
+    results[0] = delivered / (time.perf_counter() - start)
+
+    for shard_count in shard_counts:
+        with ShardedServer(server, shard_count=shard_count) as sharded:
+            sharded.query("get_routers?")
+            start = time.perf_counter()
+            for id in range(message_count):
+                sharded.send_message_to_all(message, id + message_count)
+            sharded.get_messages(message_count)
+            results[shard_count] = delivered / (time.perf_counter() - start)
+
+    return results
+
+
+def bench_split_message(size: int = 8 * 2 ** 20, mtu: int = 1500) -> tuple[float, float]:
+    """
+    Split a large payload into packets, as a string and as bytes.
+
+    Strings are copied piece by piece, bytes are split into memoryview slices without copying.
+    Return the number of megabytes split per second for both.
+    """
+    server = Server(mtu=mtu)
+    text = "x" * size
+    data = text.encode()
+
+    results = []
+    for message in (text, data):
+        start = time.perf_counter()
+        for _ in range(10):
+            server.split_message(message)
+        results.append(10 * size / 2 ** 20 / (time.perf_counter() - start))
+
+    return results[0], results[1]
+
+
+def bench_capture_replay(packet_count: int = 1_000_000) -> tuple[float, float]:
+    """
+    Record packets sent by a server to a trace file and replay the trace into a fresh topology.
+
+    Return the number of recorded and of replayed packets per second.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "trace.bin")
+        server, ips = server_with_routers(100)
+        packets = [Packet("hello", "1.2.3.4", ips[i % len(ips)], i // 20, i % 20 + 1) for i in range(packet_count)]
+
+        with PacketRecorder(path) as recorder:
+            server.recorder = recorder
+            start = time.perf_counter()
+            for packet in packets:
+                server.send_packet_to_ip(packet)
+            recording = packet_count / (time.perf_counter() - start)
+
+        fresh_server, _ = server_with_routers(100)
+        start = time.perf_counter()
+        replay(path, fresh_server)
+        replaying = packet_count / (time.perf_counter() - start)
+
+    return recording, replaying
+
+
+def bench_restart_router(restart_count: int = 1_000) -> float:
+    """
+    Restart a router holding all 253 hosts of its subnet, so every restart has to rotate the addresses.
+
+    Return the number of restarts per second.
+    """
+    router = full_router()
+
+    start = time.perf_counter()
+    for _ in range(restart_count):
+        router.restart_router()
+    elapsed = time.perf_counter() - start
+
+    return restart_count / elapsed
+
+
+def bench_large_subnet(prefix_length: int = 16, packet_count: int = 1_000_000) -> tuple[float, float]:
+    """
+    Fill a router of a large CIDR subnet with devices and send packets to random hosts of it.
+
+    Return the number of added devices per second and the number of routed packets per second.
+    """
+    router = RouterPlus(f"10.0.0.1/{prefix_length}")
+    server = Server()
+    server.set_ip_address("1.2.3.4")
+    server.add_router(router)
+    devices = [EndDevicePlus() for _ in range(len(router.address_pool))]
+
+    start = time.perf_counter()
+    for device in devices:
+        router.add_device(device)
+    filling = len(devices) / (time.perf_counter() - start)
+
+    rng = random.Random(17)
+    packets = [Packet("hello", "1.2.3.4", rng.choice(devices).get_ip_address(), i, 1) for i in range(packet_count)]
+    start = time.perf_counter()
+    for packet in packets:
+        server.send_packet_to_ip(packet)
+    routing = packet_count / (time.perf_counter() - start)
+
+    return filling, routing
+
+
+def bench_packet_memory(packet_count: int = 1_000_000) -> float:
+    """
+    Buffer packets on a device and measure the memory they take.
+
+    Packet contents are shared, so only the packets themselves and the device's buffers are measured.
+    Return the number of megabytes per million buffered packets.
+    """
+    device = EndDevicePlus()
+    tracemalloc.start()
+    for i in range(packet_count):
+        device.add_packet(Packet("hello", "1.2.3.4", "192.168.1.2", i // 20, i % 20 + 1))
+    used, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return used / 2 ** 20 * 1_000_000 / packet_count
+
+
+if __name__ == "__main__":
+    """Run all benchmarks."""
+    print(f"router delivery: {bench_router_delivery():,.0f} packets/s")
+    print(f"get_message: {bench_get_message():,.0f} messages/s")
+    print(f"restart full router: {bench_restart_router():,.0f} restarts/s")
+    print(f"server routing: {bench_server_routing():,.0f} packets/s")
+    one_by_one, batched = bench_send_messages()
+    print(f"send_message_to_ip: {one_by_one:,.0f} packets/s, send_messages: {batched:,.0f} packets/s")
+    print(f"send_message_to_all: {bench_send_message_to_all():,.0f} delivered packets/s")
+    print(f"async flows: {bench_async_flows()}")
+    for loss in (0.1, 0.3):
+        print(f"lossy reassembly at {loss:.0%} loss: {bench_lossy_reassembly(loss):,.0f} messages/s")
+    regex_path, parse_many_path = bench_ipv4_parsing()
+    print(f"ipv4 parsing: regex {regex_path:,.0f} addresses/s, parse_many {parse_many_path:,.0f} addresses/s")
+    print(f"sharded send_message_to_all (shards: packets/s): {bench_sharded_send_message_to_all()}")
+    as_string, as_bytes = bench_split_message()
+    print(f"split 8 MB at MTU 1500: string {as_string:,.0f} MB/s, memoryview {as_bytes:,.0f} MB/s")
+    recording, replaying = bench_capture_replay()
+    print(f"capture: {recording:,.0f} packets/s, replay: {replaying:,.0f} packets/s")
+    filling, routing = bench_large_subnet()
+    print(f"/16 subnet: {filling:,.0f} devices added/s, {routing:,.0f} packets routed/s")
+    print(f"packet memory: {bench_packet_memory():,.0f} MB per million buffered packets")
@@ -0,0 +1,131 @@
+"""Capture packets to a binary trace file and replay them."""
+
+import mmap
+import struct
+import sys
+import time
+
+from router import Packet
+
+TRACE_MAGIC = b"PKTTRACE\x01"
+
+# timestamp, source IP, destination IP, id, sequence number, content length, flags
+RECORD_HEADER = struct.Struct("<dIIqiIB")
+
+CONTENT_IS_BYTES = 1
+SOURCE_NOT_IPV4 = 2
+DESTINATION_NOT_IPV4 = 4
+
+
+class PacketRecorder:
+    """
+    Write packets to a binary trace file.
+
+    Every packet is written as a fixed-width RECORD_HEADER followed by its content
+    (UTF-8 for string content). IPs are stored as 32-bit integers. IPs that are not valid IPv4,
+    such as the empty IP of a server without an address, are flagged and replayed as empty IPs.
+
+    Set a recorder as the recorder of a Server or Router to capture every packet it handles.
+    Routers and servers are pickled without their recorder, so the routers of a ShardedServer
+    are not recorded while they run in its workers.
+    """
+
+    def __init__(self, path: str, clock=time.time):
+        """Open the trace file for writing, replacing any existing file."""
+        self.file = open(path, "wb")
+        self.file.write(TRACE_MAGIC)
+        self.clock = clock
+        self.recorded_packets = 0
+
+    def __enter__(self) -> "PacketRecorder":
+        """Return the recorder."""
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        """Close the trace file."""
+        self.close()
+
+    def record(self, packet: Packet) -> None:
+        """Append a packet to the trace, stamped with the current time."""
+        content = packet.content
+        flags = 0
+        if isinstance(content, str):
+            content = content.encode()
+        else:
+            flags |= CONTENT_IS_BYTES
+        source, destination = packet.source, packet.destination
+        if not isinstance(source, int):
+            source, flags = 0, flags | SOURCE_NOT_IPV4
+        if not isinstance(destination, int):
+            destination, flags = 0, flags | DESTINATION_NOT_IPV4
+
+        self.file.write(RECORD_HEADER.pack(self.clock(), source, destination, packet.id, packet.sequence_number,
+                                           len(content), flags))
+        self.file.write(content)
+        self.recorded_packets += 1
+
+    def record_many(self, packets: list[Packet]) -> None:
+        """Append many packets to the trace."""
+        for packet in packets:
+            self.record(packet)
+
+    def close(self) -> None:
+        """Flush and close the trace file."""
+        self.file.close()
+
+
+def read_trace(path: str):
+    """
+    Read the packets of a trace file in the order they were recorded.
+
+    The file is memory-mapped, so traces larger than the memory are streamed from disk.
+    Yield (timestamp, packet) tuples.
+
+    :raises ValueError: If the file is not a packet trace.
+    """
+    with open(path, "rb") as file:
+        if file.read(len(TRACE_MAGIC)) != TRACE_MAGIC:
+            raise ValueError(f"{path} is not a packet trace.")
+        if file.seek(0, 2) == len(TRACE_MAGIC):
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as trace:
+            unpack_from, header_size = RECORD_HEADER.unpack_from, RECORD_HEADER.size
+            offset, end = len(TRACE_MAGIC), len(trace)
+            while offset < end:
+                timestamp, source, destination, id, sequence_number, length, flags = unpack_from(trace, offset)
+                offset += header_size
+                content = trace[offset:offset + length]
+                offset += length
+
+                yield timestamp, Packet(content if flags & CONTENT_IS_BYTES else content.decode(),
+                                        "" if flags & SOURCE_NOT_IPV4 else source,
+                                        "" if flags & DESTINATION_NOT_IPV4 else destination,
+                                        id, sequence_number)
+
+
+def replay(path: str, server, paced: bool = False) -> int:
+    """
+    Send every packet of a trace through the server with send_packet_to_ip().
+
+    By default packets are sent at full speed. With paced set, the gaps between the recorded timestamps are kept.
+    Return the number of replayed packets.
+    """
+    replayed = 0
+    start = first_timestamp = None
+    for timestamp, packet in read_trace(path):
+        if paced:
+            if start is None:
+                start, first_timestamp = time.perf_counter(), timestamp
+            delay = (timestamp - first_timestamp) - (time.perf_counter() - start)
+            if delay > 0:
+                time.sleep(delay)
+        server.send_packet_to_ip(packet)
+        replayed += 1
+    return replayed
+
+
+if __name__ == "__main__":
+    """Print the packets of the trace files given on the command line."""
+    for trace_path in sys.argv[1:]:
+        for recorded_at, recorded_packet in read_trace(trace_path):
+            print(f"{recorded_at:.6f} {recorded_packet}")
@@ -0,0 +1,80 @@
+"""Track the delivery of messages."""
+
+import concurrent.futures
+import time
+
+
+class MessageDroppedException(Exception):
+    """Raised by a message delivery when packets of the message were dropped."""
+
+    def __init__(self, id: int, ip_address: str, dropped: list[int]):
+        """Initialize the exception with the sequence numbers of the dropped packets."""
+        super().__init__(f"Message {id} to {ip_address or 'an invalid IP'} lost packets {dropped}")
+        self.id = id
+        self.ip_address = ip_address
+        self.dropped = dropped
+
+
+class MessageDelivery(concurrent.futures.Future):
+    """
+    Future of a message sent with Server.send_message_to_ip(..., track=True).
+
+    The delivery resolves when every recipient device holds all sequence numbers of the message.
+    Its result is then the list of recipient devices.
+    If packets were dropped on the way, the delivery fails with a MessageDroppedException
+    once the server has sent the whole message. The exception and the dropped attribute
+    list the sequence numbers of the dropped packets.
+
+    As with every future, add_done_callback() runs a callback when the delivery resolves
+    and result() waits for it, so a delivery can also be awaited with asyncio.wrap_future().
+    A delivery that is cancelled or expires (see Server.expire_deliveries()) stops being tracked.
+    """
+
+    def __init__(self, id: int, ip_address: str, packet_count: int, recipients: list):
+        """Initialize the delivery of a message of packet_count packets to the given recipient devices."""
+        super().__init__()
+        self.id = id
+        self.ip_address = ip_address
+        self.packet_count = packet_count
+        self.recipients = list(recipients)
+        # Every recipient holds an empty message already
+        self.pending = set(self.recipients) if packet_count else set()
+        self.dropped = []
+        self.sending = True
+        self.sent_at = time.monotonic()
+
+    def message_arrived(self, device, id: int) -> None:
+        """Device callback: a recipient holds the whole message."""
+        self.pending.discard(device)
+        if not self.pending and not self.sending and not self.dropped and not self.done():
+            self.set_result(self.recipients)
+
+    def drop(self, sequence_number: int) -> None:
+        """Report a dropped packet of the message."""
+        if not self.done():
+            self.dropped.append(sequence_number)
+
+    def sent(self) -> None:
+        """
+        Mark the message as completely sent by the server.
+
+        Every drop has been reported by now, so the delivery fails if there were any.
+        """
+        self.sending = False
+        if self.done():
+            return None
+        if self.dropped:
+            self.set_exception(MessageDroppedException(self.id, self.ip_address, sorted(set(self.dropped))))
+        elif not self.pending:
+            self.set_result(self.recipients)
+
+    def expire(self) -> None:
+        """Fail the delivery with a TimeoutError if it has not resolved yet."""
+        if not self.done():
+            self.set_exception(TimeoutError(f"Message {self.id} to {self.ip_address or 'an invalid IP'} "
+                                            f"was not delivered in time"))
+
+    def release(self) -> None:
+        """Make the recipients that are still waiting for the message stop expecting it."""
+        for device in self.pending:
+            device.stop_expecting(self.id, self.message_arrived)
@@ -0,0 +1,168 @@
+"""Test."""
+
+import concurrent.futures
+import time
+
+import pytest
+
+from delivery import MessageDelivery, MessageDroppedException
+from lossy_link import LossyLink
+from server import EndDevicePlus, RouterPlus, Server
+
+
+def make_network(device_count=1):
+    server = Server()
+    server.set_ip_address("1.2.3.4")
+    router = RouterPlus("10.0.0.1")
+    devices = [EndDevicePlus() for _ in range(device_count)]
+    for device in devices:
+        router.add_device(device)
+    server.add_router(router)
+    return server, router, devices
+
+
+#MessageDelivery tests
+def test_delivery_resolves_when_sent_and_arrived():
+    device = object()
+    delivery = MessageDelivery(1, "10.0.0.2", 2, [device])
+    delivery.message_arrived(device, 1)
+
+    assert not delivery.done()
+    delivery.sent()
+    assert delivery.result() == [device]
+
+
+def test_delivery_fails_with_dropped_packets():
+    delivery = MessageDelivery(1, "10.0.0.2", 3, [])
+    delivery.drop(3)
+    delivery.drop(1)
+    delivery.sent()
+
+    with pytest.raises(MessageDroppedException) as error:
+        delivery.result()
+    assert error.value.dropped == [1, 3]
+
+
+def test_delivery_expire():
+    delivery = MessageDelivery(1, "10.0.0.2", 1, [object()])
+    delivery.sent()
+    delivery.expire()
+
+    assert delivery.done()
+    with pytest.raises(TimeoutError):
+        delivery.result()
+
+
+def test_empty_delivery_waits_for_nobody():
+    delivery = MessageDelivery(1, "10.0.0.2", 0, [object()])
+    delivery.sent()
+
+    assert delivery.done()
+
+
+#Server tracking tests
+def test_untracked_send_returns_none():
+    server, _, devices = make_network()
+
+    assert server.send_message_to_ip("hello", devices[0].get_ip_address(), 1) is None
+    assert server.deliveries == {}
+    assert devices[0].expected_messages == {}
+
+
+def test_tracked_send_resolves():
+    server, _, devices = make_network()
+    delivery = server.send_message_to_ip("pretty long message", devices[0].get_ip_address(), 1, track=True)
+
+    assert delivery.result(timeout=0) == devices
+    assert server.deliveries == {}
+    assert devices[0].expected_messages == {}
+
+
+def test_tracked_broadcast_resolves_for_every_device():
+    server, router, devices = make_network(3)
+    delivery = server.send_message_to_ip("hello", router.get_broadcast_address(), 1, track=True)
+
+    assert delivery.result(timeout=0) == devices
+
+
+def test_tracked_send_to_unknown_ip_fails():
+    server, _, _ = make_network()
+    delivery = server.send_message_to_ip("lost", "10.0.0.99", 8, track=True)
+
+    assert isinstance(delivery.exception(timeout=0), MessageDroppedException)
+    assert delivery.exception().dropped == [1]
+
+
+def test_tracked_empty_message_resolves_at_once():
+    server, _, devices = make_network()
+    delivery = server.send_message_to_ip("", devices[0].get_ip_address(), 1, track=True)
+
+    assert delivery.result(timeout=0) == devices
+    assert devices[0].expected_messages == {}
+
+
+def test_old_packets_with_same_id_do_not_resolve_delivery():
+    server, _, devices = make_network()
+    server.send_message_to_ip("old message", devices[0].get_ip_address(), 5)
+    link = LossyLink(reorder=1.0, seed=1)
+    server.set_link(link)
+    delivery = server.send_message_to_ip("new message", devices[0].get_ip_address(), 5, track=True)
+
+    assert not delivery.done()
+    link.flush()
+    assert delivery.result(timeout=0) == devices
+
+
+def test_lossy_link_drops_fail_delivery():
+    server, _, devices = make_network()
+    server.set_link(LossyLink(loss=1.0, seed=1))
+    delivery = server.send_message_to_ip("hello world", devices[0].get_ip_address(), 1, track=True)
+
+    assert delivery.exception(timeout=0).dropped == [1, 2, 3]
+
+
+def test_cancelled_delivery_is_forgotten():
+    server, _, devices = make_network()
+    server.set_link(LossyLink(reorder=1.0, seed=1))
+    delivery = server.send_message_to_ip("hello", devices[0].get_ip_address(), 1, track=True)
+
+    assert delivery.cancel()
+    assert server.deliveries == {}
+    assert devices[0].expected_messages == {}
+
+
+def test_resending_id_cancels_earlier_delivery():
+    server, _, devices = make_network()
+    server.set_link(LossyLink(reorder=1.0, seed=1))
+    first = server.send_message_to_ip("hello", devices[0].get_ip_address(), 1, track=True)
+    second = server.send_message_to_ip("hello", devices[0].get_ip_address(), 1, track=True)
+
+    assert first.cancelled()
+    assert list(server.deliveries.values()) == [second]
+
+
+def test_expire_deliveries(monkeypatch):
+    server, _, devices = make_network()
+    server.set_link(LossyLink(reorder=1.0, seed=1))
+    now = [100.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    delivery = server.send_message_to_ip("hello", devices[0].get_ip_address(), 1, track=True)
+
+    now[0] = 104.0
+    assert server.expire_deliveries(5) == 0
+    now[0] = 106.0
+    assert server.expire_deliveries(5) == 1
+    assert delivery.done()
+    with pytest.raises(TimeoutError):
+        delivery.result(timeout=0)
+    assert server.deliveries == {}
+    assert devices[0].expected_messages == {}
+
+
+def test_pending_delivery_times_out_on_result():
+    server, _, devices = make_network()
+    server.set_link(LossyLink(reorder=1.0, seed=1))
+    delivery = server.send_message_to_ip("hello", devices[0].get_ip_address(), 1, track=True)
+
+    with pytest.raises(concurrent.futures.TimeoutError):
+        delivery.result(timeout=0)
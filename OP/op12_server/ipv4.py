@@ -0,0 +1,81 @@
+"""Validate, parse and format IPv4 addresses."""
+
+import functools
+import re
+import socket
+
+OCTET = r"(25[0-5]|2[0-4][0-9]|1[0-9][0-9]|[1-9]?[0-9])"
+IPV4_PATTERN = re.compile(rf"{OCTET}\.{OCTET}\.{OCTET}\.{OCTET}")
+
+
+def is_valid_ipv4(ip_address: str) -> bool:
+    """
+    Validate IPv4.
+
+    A valid IPv4 is four decimal numbers in the range [0, 255] separated by dots, without leading zeros.
+    """
+    return IPV4_PATTERN.fullmatch(ip_address) is not None
+
+
+def ip_to_int(ip_address: str) -> int | None:
+    """
+    Convert a dotted IPv4 string to a 32-bit integer, or return None if it is not a valid IPv4.
+
+    Validation and parsing happen in one pass in C: inet_pton parses the address
+    and formatting it back with inet_ntoa rejects any form other than the canonical one.
+    """
+    try:
+        packed = socket.inet_pton(socket.AF_INET, ip_address)
+    except (OSError, ValueError):
+        return None
+    return int.from_bytes(packed, "big") if socket.inet_ntoa(packed) == ip_address else None
+
+
+def parse_many(ip_addresses: list[str]) -> list[int | None]:
+    """Convert many dotted IPv4 strings to 32-bit integers at once, with None for every invalid one."""
+    inet_pton, inet_ntoa, af_inet, from_bytes = socket.inet_pton, socket.inet_ntoa, socket.AF_INET, int.from_bytes
+    values = []
+    append = values.append
+    for ip_address in ip_addresses:
+        try:
+            packed = inet_pton(af_inet, ip_address)
+        except (OSError, ValueError):
+            append(None)
+            continue
+        append(from_bytes(packed, "big") if inet_ntoa(packed) == ip_address else None)
+    return values
+
+
+def validate_many(ip_addresses: list[str]) -> list[bool]:
+    """Validate many IPv4 strings at once."""
+    fullmatch = IPV4_PATTERN.fullmatch
+    return [fullmatch(ip_address) is not None for ip_address in ip_addresses]
+
+
+def int_to_ip(value: int) -> str:
+    """Convert a 32-bit integer to a dotted IPv4 string."""
+    return f"{value >> 24}.{value >> 16 & 255}.{value >> 8 & 255}.{value & 255}"
+
+
+def pack_ip(ip_address: str | int) -> str | int:
+    """
+    Convert an IP to the form packets and routers store it in.
+
+    Valid IPv4 strings become 32-bit integers, integers are kept as they are.
+    Anything else (such as an empty IP) is kept as the given string.
+    """
+    if isinstance(ip_address, int):
+        return ip_address
+    return _pack_ip_string(ip_address)
+
+
+@functools.lru_cache(maxsize=65536)
+def _pack_ip_string(ip_address: str) -> str | int:
+    """Pack an IP string, caching the result so packets to the same IP share one int object."""
+    value = ip_to_int(ip_address)
+    return ip_address if value is None else value
+
+
+def unpack_ip(ip_address: str | int) -> str:
+    """Convert an IP stored by pack_ip() back to a string."""
+    return int_to_ip(ip_address) if isinstance(ip_address, int) else ip_address
@@ -0,0 +1,79 @@
+"""Lose, reorder and duplicate packets between the server and its routers."""
+
+import random
+
+from router import Packet, Router
+
+
+class LossyLink:
+    """
+    Unreliable link between a server and its routers.
+
+    Every packet sent over the link is:
+        dropped with probability loss,
+        otherwise held back with probability reorder, so it arrives after the next packet to the same router,
+        and delivered twice with probability duplicate.
+
+    The faults come from a random.Random seeded with seed, so a run can be repeated exactly.
+    Use Server.set_link() to put the link between a server and its routers.
+    Dropped packets are passed to on_drop(packet), if set. Server.set_link() sets it to report them to the server.
+    """
+
+    def __init__(self, loss: float = 0.0, reorder: float = 0.0, duplicate: float = 0.0, seed: int = None):
+        """Initialize the link with the probabilities of each fault."""
+        self.loss = loss
+        self.reorder = reorder
+        self.duplicate = duplicate
+        self.random = random.Random(seed)
+
+        self.held = {}
+        self.sent_packets = 0
+        self.dropped_packets = 0
+        self.reordered_packets = 0
+        self.duplicated_packets = 0
+        self.on_drop = None
+
+    def send(self, router: Router, packets: list[Packet]) -> None:
+        """Send packets to a router over the link, injecting faults."""
+        rand = self.random.random
+        delivered = []
+        held = self.held.get(router, [])
+        for packet in packets:
+            self.sent_packets += 1
+            if rand() < self.loss:
+                self.dropped_packets += 1
+                if self.on_drop is not None:
+                    self.on_drop(packet)
+                continue
+            copies = 2 if rand() < self.duplicate else 1
+            self.duplicated_packets += copies - 1
+            if rand() < self.reorder:
+                self.reordered_packets += 1
+                held.extend([packet] * copies)
+                continue
+            delivered.extend([packet] * copies)
+            # Held packets arrive after the packet that overtook them
+            delivered.extend(held)
+            held = []
+
+        if held:
+            self.held[router] = held
+        else:
+            self.held.pop(router, None)
+        if delivered:
+            router.receive_packets(delivered)
+
+    def flush(self) -> None:
+        """Deliver every packet that is still held back."""
+        held, self.held = self.held, {}
+        for router, packets in held.items():
+            router.receive_packets(packets)
+
+    def get_stats(self) -> dict:
+        """Return how many packets were sent over the link and how many were affected by each fault."""
+        return {
+            "sent": self.sent_packets,
+            "dropped": self.dropped_packets,
+            "reordered": self.reordered_packets,
+            "duplicated": self.duplicated_packets,
+        }
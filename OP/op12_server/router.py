@@ -1,26 +1,88 @@
 """Route all the packets."""
-import re
+import builtins
+import collections
+import heapq
+import itertools
+import operator
+import time
+
+from ipv4 import int_to_ip, ip_to_int, pack_ip, unpack_ip
 
 
 class Packet:
-    """Packet class."""
+    """
+    Packet class.
+
+    Packets use __slots__ and keep the IPs packed as 32-bit integers in source and destination,
+    so routing never parses strings. source_ip and destination_ip give the IPs back as strings.
+    """
+
+    __slots__ = ("content", "source", "destination", "id", "sequence_number")
 
-    def __init__(self, content: str, source_ip: str, destination_ip: str, id: int, sequence_number: int):
+    def __init__(self, content: str, source_ip: str | int, destination_ip: str | int, id: int, sequence_number: int):
         """Initialize packet class."""
         self.content = content
-        self.source_ip = source_ip
-        self.destination_ip = destination_ip
+        self.source = pack_ip(source_ip)
+        self.destination = pack_ip(destination_ip)
         self.id = id
         self.sequence_number = sequence_number
 
+    @property
+    def source_ip(self) -> str:
+        """Return the source IP as a string."""
+        return unpack_ip(self.source)
+
+    @source_ip.setter
+    def source_ip(self, ip_address: str | int) -> None:
+        """Set the source IP, stored packed like in __init__."""
+        self.source = pack_ip(ip_address)
+
+    @property
+    def destination_ip(self) -> str:
+        """Return the destination IP as a string."""
+        return unpack_ip(self.destination)
+
+    @destination_ip.setter
+    def destination_ip(self, ip_address: str | int) -> None:
+        """Set the destination IP, stored packed like in __init__."""
+        self.destination = pack_ip(ip_address)
+
     def __repr__(self) -> str:
         """
         Represent packet.
 
         Format the string of the packet as:
         '[content] from [source_ip] to [destination_ip] ([id]:[sequence_number])'
+
+        Bytes-like content is shown as bytes.
+        """
+        content = self.content if isinstance(self.content, str) else bytes(self.content)
+        return f'{content} from {self.source_ip} to {self.destination_ip} ({self.id}:{self.sequence_number})'
+
+    def __reduce__(self) -> tuple:
+        """
+        Pickle the packet, for example to send it to another process.
+
+        Memoryviews cannot be pickled, so memoryview content (see Server.split_message) is copied into bytes.
         """
-        return f'{self.content} from {self.source_ip} to {self.destination_ip} ({self.id}:{self.sequence_number})'
+        content = self.content if isinstance(self.content, (str, bytes)) else bytes(self.content)
+        return self.__class__, (content, self.source, self.destination, self.id, self.sequence_number)
+
+
+def packet_size(packet: Packet) -> int:
+    """Return the size of a packet's content in bytes. Content can be a string or a bytes-like object."""
+    content = packet.content
+    return len(content.encode()) if isinstance(content, str) else memoryview(content).nbytes
+
+
+def copy_views(packets: list[Packet]) -> None:
+    """Replace the memoryview content of packets with a bytes copy, which does not keep the viewed buffer alive."""
+    for packet in packets:
+        if type(packet.content) is memoryview:
+            packet.content = bytes(packet.content)
+
+
+EVICTION_POLICIES = ("fifo", "lru", "ttl")
 
 
 class EndDevice:
@@ -32,9 +94,35 @@ class EndDevice:
 
         End device will have an IP address if they are connected to a router.
         Also, end device will collect all packets that are sent to them.
+
+        By default the packet history is unbounded. Use set_retention() to limit it.
+        Set on_message to a callback(device, id) to be told when a message the device expects is complete.
         """
         self.ip_address = ""
-        self.packets = []
+        self.packets = collections.deque()
+        self.packets_by_id = {}
+        self.router = None
+        self.drop_duplicates = False
+        self.duplicate_packets = 0
+        self.irregular_ids = set()
+        self.stats = None
+        self.expected_messages = {}
+        self.on_message = None
+
+        self.max_packets = None
+        self.max_bytes = None
+        self.eviction_policy = "fifo"
+        self.ttl = None
+        self.bounded = False
+        self.stored_bytes = 0
+        self.arrival_times = collections.deque()
+        self.recent_ids = collections.OrderedDict()
+        self.evicted_packets = 0
+        self.evicted_bytes = 0
+        # Packets evicted by message stay in the packets deque until they reach its head or it is compacted.
+        # They are counted by identity, and always come before any later copy of the same packet object.
+        self.tombstones = collections.Counter()
+        self.tombstone_count = 0
 
     def get_ip_address(self) -> str:
         """Return the current IP address of the device."""
@@ -45,39 +133,394 @@ class EndDevice:
         Set an IP address for the device.
 
         You don't need to validate the IP address here.
+        If the device is connected to a router, the router's IP index is updated as well.
         """
+        if self.router is not None:
+            self.router.update_device_ip(self, self.ip_address, ip_address)
         self.ip_address = ip_address
 
+    def set_retention(self, max_packets: int = None, max_bytes: int = None, policy: str = "fifo", ttl: float = None) -> None:
+        """
+        Limit the packet history of the device.
+
+        When the device holds more than max_packets packets or more than max_bytes bytes of content,
+        packets are evicted according to the policy:
+            "fifo" - the oldest packets are evicted first.
+            "lru" - all packets of the least recently used message ID are evicted first.
+                    A message is used when one of its packets arrives or when it is read with get_message().
+            "ttl" - like "fifo", but packets are also evicted ttl seconds after they arrived.
+
+        Calling set_retention() without limits makes the history unbounded again.
+        Packets that exceed the new limits are evicted immediately.
+
+        :raises ValueError: If the policy is unknown or the "ttl" policy is given without a ttl.
+        """
+        if policy not in EVICTION_POLICIES:
+            raise ValueError(f"Unknown eviction policy: {policy}")
+        if policy == "ttl" and ttl is None:
+            raise ValueError("The ttl policy needs a ttl.")
+
+        self.max_packets = max_packets
+        self.max_bytes = max_bytes
+        self.eviction_policy = policy
+        self.ttl = ttl if policy == "ttl" else None
+        self.bounded = max_packets is not None or max_bytes is not None or self.ttl is not None
+
+        self.compact()
+        if max_bytes is not None:
+            copy_views(self.packets)
+        self.stored_bytes = sum(map(packet_size, self.packets)) if max_bytes is not None else 0
+        now = time.monotonic()
+        self.arrival_times = collections.deque(now for _ in self.packets) if self.ttl is not None else collections.deque()
+        self.recent_ids = collections.OrderedDict.fromkeys(self.packets_by_id) if policy == "lru" else collections.OrderedDict()
+        self.evict()
+
+    def get_retention_stats(self) -> dict:
+        """Return how many packets and bytes the device holds and how many it has evicted."""
+        return {
+            "packets": len(self.packets) - self.tombstone_count,
+            "bytes": self.stored_bytes if self.max_bytes is not None else sum(map(packet_size, self.get_packet_history())),
+            "evicted_packets": self.evicted_packets,
+            "evicted_bytes": self.evicted_bytes,
+        }
+
     def add_packet(self, packet: Packet) -> None:
-        """Add a packet to end device."""
+        """
+        Add a packet to end device.
+
+        The packet is also put into its message's bucket, where it takes the slot of its sequence number.
+        A packet whose slot is already taken is a duplicate. Duplicates are counted in duplicate_packets
+        and, if drop_duplicates is set, not stored at all.
+        Stored duplicates and sequence numbers below 1 do not fit the slots, so their message IDs are
+        remembered in irregular_ids and such messages are reassembled from the packet history instead.
+        """
+        slots = self.packets_by_id.get(packet.id)
+        if slots is None:
+            slots = self.packets_by_id[packet.id] = {}
+        elif packet.sequence_number in slots:
+            self.duplicate_packets += 1
+            if self.stats is not None:
+                self.stats.count("duplicates")
+            if self.drop_duplicates:
+                return None
+            self.irregular_ids.add(packet.id)
+        if packet.sequence_number < 1:
+            self.irregular_ids.add(packet.id)
+        slots[packet.sequence_number] = packet
         self.packets.append(packet)
+        if self.stats is not None:
+            self.stats.count("packets_in")
+            self.stats.count("bytes_in", packet_size(packet))
+        if self.expected_messages:
+            # Expectations are sorted by packet count, so a message can only be complete with enough slots
+            expectations = self.expected_messages.get(packet.id)
+            if expectations is not None and len(slots) >= expectations[0][0]:
+                self.complete_message(packet.id)
+        if self.bounded:
+            self.track((packet,))
+
+    def add_packets(self, packets: list[Packet]) -> None:
+        """Add many packets to end device at once, in the given order."""
+        packets_by_id = self.packets_by_id
+        accepted = []
+        for packet in packets:
+            slots = packets_by_id.get(packet.id)
+            if slots is None:
+                slots = packets_by_id[packet.id] = {}
+            elif packet.sequence_number in slots:
+                self.duplicate_packets += 1
+                if self.stats is not None:
+                    self.stats.count("duplicates")
+                if self.drop_duplicates:
+                    continue
+                self.irregular_ids.add(packet.id)
+            if packet.sequence_number < 1:
+                self.irregular_ids.add(packet.id)
+            slots[packet.sequence_number] = packet
+            accepted.append(packet)
+        self.packets.extend(accepted)
+        if self.stats is not None:
+            self.stats.count("packets_in", len(accepted))
+            self.stats.count("bytes_in", sum(map(packet_size, accepted)))
+        if self.expected_messages:
+            for id in self.expected_messages.keys() & set(map(operator.attrgetter("id"), accepted)):
+                self.complete_message(id)
+        if self.bounded:
+            self.track(accepted)
+
+    def expect_message(self, id: int, packet_count: int, callback=None) -> None:
+        """
+        Wait for the message with the given ID to arrive.
+
+        The message is complete when the device holds all sequence numbers from 1 to packet_count.
+        Then callback(device, id) and the device's on_message(device, id) are called, if set.
+
+        Only packets that arrive from now on count: packets of an earlier message with the same ID
+        that the device already holds are remembered as stale and never complete the message.
+        An empty message is complete at once, so it is not waited for.
+        """
+        slots = self.packets_by_id.get(id)
+        stale = {number: slots[number] for number in range(1, packet_count + 1) if number in slots} if slots else {}
+        expectations = self.expected_messages.setdefault(id, [])
+        expectations.append((packet_count, callback, stale))
+        expectations.sort(key=operator.itemgetter(0))
+        if packet_count < 1:
+            self.complete_message(id)
+
+    def stop_expecting(self, id: int, callback=None) -> None:
+        """Stop waiting for the message with the given ID on behalf of the given callback."""
+        expectations = [expectation for expectation in self.expected_messages.get(id, ()) if expectation[1] != callback]
+        if expectations:
+            self.expected_messages[id] = expectations
+        else:
+            self.expected_messages.pop(id, None)
+
+    def complete_message(self, id: int) -> None:
+        """Call the callbacks of every expectation of the message with the given ID that is now complete."""
+        slots = self.packets_by_id.get(id, {})
+        completed = []
+        waiting = []
+        for packet_count, callback, stale in self.expected_messages.pop(id):
+            if len(slots) >= packet_count and all(number in slots and slots[number] is not stale.get(number)
+                                                  for number in range(1, packet_count + 1)):
+                completed.append(callback)
+            else:
+                waiting.append((packet_count, callback, stale))
+        if waiting:
+            self.expected_messages[id] = waiting
+
+        for callback in completed:
+            if callback is not None:
+                callback(self, id)
+            if self.on_message is not None:
+                self.on_message(self, id)
+
+    def track(self, packets: list[Packet]) -> None:
+        """
+        Account for newly added packets in the retention limits and evict packets if needed.
+
+        With a byte budget, memoryview content is copied into bytes, so a stored packet does not keep
+        the rest of its message's buffer alive beyond the budget. The copy is shared by all holders of the packet.
+        """
+        if self.max_bytes is not None:
+            copy_views(packets)
+            self.stored_bytes += sum(map(packet_size, packets))
+        if self.ttl is not None:
+            self.arrival_times.extend(itertools.repeat(time.monotonic(), len(packets)))
+        if self.eviction_policy == "lru":
+            for packet in packets:
+                self.recent_ids[packet.id] = None
+                self.recent_ids.move_to_end(packet.id)
+        self.evict()
+
+    def is_over_limit(self) -> bool:
+        """Check if the device holds more packets or bytes than its retention allows."""
+        return ((self.max_packets is not None and len(self.packets) - self.tombstone_count > self.max_packets)
+                or (self.max_bytes is not None and self.stored_bytes > self.max_bytes))
+
+    def evict(self) -> None:
+        """Evict expired packets and then evict packets until the device is within its retention limits."""
+        if self.ttl is not None:
+            deadline = time.monotonic() - self.ttl
+            while self.arrival_times and self.arrival_times[0] <= deadline:
+                self.evict_oldest()
+        while self.is_over_limit():
+            if self.eviction_policy == "lru" and self.recent_ids:
+                self.evict_message(next(iter(self.recent_ids)))
+            else:
+                self.evict_oldest()
+
+    def evict_oldest(self) -> None:
+        """Evict the oldest packet, or drop it from the deque if it was already evicted with its message."""
+        packet = self.packets.popleft()
+        if self.arrival_times:
+            self.arrival_times.popleft()
+        key = id(packet)
+        if self.tombstones[key]:
+            self.tombstones[key] -= 1
+            if not self.tombstones[key]:
+                del self.tombstones[key]
+            self.tombstone_count -= 1
+        else:
+            self.forget(packet)
+
+    def evict_message(self, id: int) -> None:
+        """
+        Evict all packets with the given ID.
+
+        The packets of a message are exactly the packets in its bucket, unless it has stored duplicates.
+        They are marked as evicted instead of being removed from the middle of the deque,
+        so evicting a message takes time proportional to its size. The deque is compacted once
+        most of it is evicted packets. Messages with stored duplicates are found by a scan of the deque.
+        """
+        if id in self.irregular_ids:
+            self.compact()
+            packets = [packet for packet in self.packets if packet.id == id]
+        else:
+            packets = list(self.packets_by_id.get(id, {}).values())
+        for packet in packets:
+            self.tombstones[builtins.id(packet)] += 1
+            self.forget(packet)
+        self.tombstone_count += len(packets)
+        self.recent_ids.pop(id, None)
+        if self.tombstone_count * 2 > len(self.packets):
+            self.compact()
+
+    def compact(self) -> None:
+        """Remove the packets evicted with their message from the packets deque and the arrival times."""
+        if not self.tombstone_count:
+            return None
+        tombstones = self.tombstones
+        kept_packets = collections.deque()
+        kept_times = collections.deque()
+        times = self.arrival_times if self.arrival_times else itertools.repeat(None)
+        for packet, arrival_time in zip(self.packets, times):
+            key = id(packet)
+            if tombstones[key]:
+                tombstones[key] -= 1
+            else:
+                kept_packets.append(packet)
+                kept_times.append(arrival_time)
+        self.packets = kept_packets
+        if self.arrival_times:
+            self.arrival_times = kept_times
+        self.tombstones = collections.Counter()
+        self.tombstone_count = 0
+
+    def get_packet_history(self) -> collections.deque:
+        """Get the packets deque without the packets evicted with their message."""
+        self.compact()
+        return self.packets
+
+    def forget(self, packet: Packet) -> None:
+        """Remove an evicted packet from its message's bucket and count it."""
+        size = packet_size(packet)
+        self.evicted_packets += 1
+        self.evicted_bytes += size
+        if self.max_bytes is not None:
+            self.stored_bytes -= size
+
+        slots = self.packets_by_id.get(packet.id)
+        if slots is not None and slots.get(packet.sequence_number) is packet:
+            del slots[packet.sequence_number]
+            if not slots:
+                del self.packets_by_id[packet.id]
+                self.recent_ids.pop(packet.id, None)
 
     def clear_packet_history(self) -> None:
         """Clear all packets from history."""
-        self.packets = []
+        self.packets = collections.deque()
+        self.packets_by_id = {}
+        self.irregular_ids = set()
+        self.tombstones = collections.Counter()
+        self.tombstone_count = 0
+        self.stored_bytes = 0
+        self.arrival_times = collections.deque()
+        self.recent_ids = collections.OrderedDict()
 
     def get_all_packets(self) -> list[Packet]:
         """Get a list of all packets in the order they were added."""
-        return self.packets
+        if self.ttl is not None:
+            self.evict()
+        return list(self.get_packet_history())
 
     def get_all_packets_by_id(self, given_id: int) -> list[Packet]:
         """Get a list of all packets that have the given ID."""
-        return list(filter(lambda packet: packet.id == given_id, self.packets))
+        return list(filter(lambda packet: packet.id == given_id, self.get_packet_history()))
 
     def get_all_packets_by_source_ip(self, given_ip: str) -> list[Packet]:
         """Get a list of all packets that have given source IP."""
-        return list(filter(lambda packet: packet.source_ip == given_ip, self.packets))
+        source = pack_ip(given_ip)
+        return list(filter(lambda packet: packet.source == source, self.get_packet_history()))
+
+
+class AddressPool:
+    """
+    Pool of free host numbers in a subnet.
+
+    Hosts are handed out lowest first. Hosts from next_host upwards that were never handed out
+    are not stored at all, so a /16 pool costs as little memory as a /24 one.
+    Hosts given back are kept in a set for O(1) membership and in a min-heap, so finding the lowest
+    free host is O(log n). Hosts taken out of order above next_host are remembered in taken_ahead.
+    """
+
+    def __init__(self, first_host: int, last_host: int):
+        """Initialize the pool with every host in the range [first_host, last_host] free."""
+        self.first_host = first_host
+        self.last_host = last_host
+        self.next_host = first_host
+        self.taken_ahead = set()
+        self.released = set()
+        self.heap = []
+
+    def __len__(self) -> int:
+        """Return the number of free hosts."""
+        return self.last_host - self.next_host + 1 - len(self.taken_ahead) + len(self.released)
+
+    def peek(self) -> int:
+        """
+        Return the lowest free host without taking it.
+
+        :raises IPv4AddressSpaceExhaustedException: If the pool is empty.
+        """
+        while self.heap and self.heap[0] not in self.released:
+            heapq.heappop(self.heap)
+        if self.heap:
+            return self.heap[0]
+        if self.next_host > self.last_host:
+            raise IPv4AddressSpaceExhaustedException()
+        return self.next_host
+
+    def allocate(self) -> int:
+        """
+        Take the lowest free host.
+
+        :raises IPv4AddressSpaceExhaustedException: If the pool is empty.
+        """
+        host = self.peek()
+        self.reserve(host)
+        return host
+
+    def allocate_many(self, count: int) -> list[int]:
+        """
+        Take the count lowest free hosts at once.
+
+        Nothing is taken if the pool does not have enough free hosts.
+
+        :raises IPv4AddressSpaceExhaustedException: If fewer than count hosts are free.
+        """
+        if count > len(self):
+            raise IPv4AddressSpaceExhaustedException()
+        return [self.allocate() for _ in range(count)]
+
+    def reserve(self, host: int) -> None:
+        """Mark a host as taken. Taking a host that is already taken or outside the pool does nothing."""
+        if host in self.released:
+            self.released.discard(host)
+        elif host in self.taken_ahead or not self.next_host <= host <= self.last_host:
+            return None
+        elif host == self.next_host:
+            self.next_host += 1
+            while self.next_host in self.taken_ahead:
+                self.taken_ahead.discard(self.next_host)
+                self.next_host += 1
+        else:
+            self.taken_ahead.add(host)
+
+    def release(self, host: int) -> None:
+        """Give a host back to the pool. Hosts outside the pool's range are ignored."""
+        if host >= self.next_host:
+            self.taken_ahead.discard(host)
+        elif host >= self.first_host and host not in self.released:
+            self.released.add(host)
+            heapq.heappush(self.heap, host)
+            if len(self.heap) > 2 * len(self.released) + 16:
+                self.heap = sorted(self.released)
 
 
 class Router:
     """Router class."""
 
-    def __validate_ipv4(self, ip_address: str) -> bool:
-        """Validate IPv4."""
-        pattern_ip = r"((\d|[1-9]\d|1\d\d|2[0-4]\d|25[0-5])\.(\d|[1-9]\d|1\d\d|2[0-4]\d|25[0-5])\.(\d|[1-9]\d|1\d\d|2[0-4]\d|25[0-5])\.(\d|[1-9]\d|1\d\d|2[0-4]\d|25[0-5]))"
-        match = re.fullmatch(pattern_ip, ip_address)
-        return match is not None
-
     def __init__(self, ip_address: str):
         """
         Initialize router.
@@ -88,18 +531,54 @@ class Router:
         If the IP address does not match this criteria, set the IP address to "192.168.0.1".
 
         The first 3 sections ("192.168.0" in this example) form a subnet. You will need this later!
+
+        Other subnet sizes can be given in CIDR notation, such as "10.0.0.1/16" or "10.16.0.1/20".
+        The router's IP must then be the first IP of the subnet, and the prefix length must be in the range [1, 30].
+        Without a prefix length the subnet is a /24.
+
+        The router's mtu (maximum packet content length) can be set to limit packets below the server's MTU.
+        None means the router adds no limit of its own.
         """
-        self.ip_address = ip_address if self.__validate_ipv4(ip_address) else "192.168.0.1"
-        self.ip_list = self.ip_address.split(".")
-        self.ip_address = self.ip_address if self.ip_list[-1] == "1" else "192.168.0.1"
+        ip_address, _, prefix = ip_address.partition("/")
+        prefix_length = int(prefix) if prefix.isascii() and prefix.isdigit() else 24 if not prefix else 0
+        value = ip_to_int(ip_address)
+        mask = (0xFFFFFFFF << (32 - prefix_length)) & 0xFFFFFFFF if 1 <= prefix_length <= 30 else 0
+
+        if value is None or not mask or value & ~mask & 0xFFFFFFFF != 1:
+            ip_address, value, prefix_length, mask = "192.168.0.1", ip_to_int("192.168.0.1"), 24, 0xFFFFFF00
+
+        self.ip_address = ip_address
 
         self.devices = []
+        self.devices_by_ip = {}
+        # Devices can share an IP, as set_ip_address() does not validate. The index holds the device that took
+        # the IP last, and shared_ips the earlier devices that still hold it, so the IP is only freed by the last one.
+        self.shared_ips = {}
+        self.prefix_length = prefix_length
+        self.mask = mask
+        self.network = value & mask
+        self.broadcast = self.network | ~mask & 0xFFFFFFFF
+        # Hosts are offsets from the network: 0 is the network, 1 is the router and the last one is broadcast
+        self.address_pool = AddressPool(2, self.broadcast - self.network - 1)
+        self.stats = None
+        self.recorder = None
+        self.mtu = None
+
+    def __getstate__(self) -> dict:
+        """Pickle the router without its recorder, whose trace file is only open in this process."""
+        state = self.__dict__.copy()
+        state["recorder"] = None
+        return state
 
     def get_ip_address(self) -> str:
         """Return the current IP address of the router."""
         return self.ip_address
 
-    def generate_ip_address(self, ip_last_part=2) -> str:
+    def get_broadcast_address(self) -> str:
+        """Return the broadcast IP of the router's subnet, the last IP of the subnet."""
+        return int_to_ip(self.broadcast)
+
+    def generate_ip_address(self) -> str:
         """
         Generate a valid IP address.
 
@@ -109,39 +588,44 @@ class Router:
         The final section can be a random number in the range [2, 254].
 
         Make sure you can't generate an IP address that's already in use by a device!
+        The lowest free host is taken from the router's address pool.
+        In larger subnets, any IP between the router's IP and the broadcast IP can be generated.
 
         If there are no possible IP addresses to generate, raise an IPv4AddressSpaceExhaustedException().
 
         :raises IPv4AddressSpaceExhaustedException: If no IPs are left to generate.
         """
-        ip_basis = ".".join(self.ip_list[:3])
-        # create new ip
-        new_ip = ip_basis + "." + str(ip_last_part)
+        return int_to_ip(self.network + self.address_pool.peek())
 
-        if ip_last_part >= 255:
-            raise IPv4AddressSpaceExhaustedException()
-
-        # check if the ip in the devices
-        if new_ip in map(lambda device: device.get_ip_address(), self.devices):
-            return self.generate_ip_address(ip_last_part + 1)
-        else:
-            return new_ip
+    def host_of(self, ip_address: str | int) -> int | None:
+        """Return the host part of a packed IP in the router's subnet, or None if it is not in the subnet."""
+        if not isinstance(ip_address, int) or ip_address & self.mask != self.network:
+            return None
+        return ip_address - self.network
 
     def add_device(self, device: EndDevice) -> bool:
         """
         Add end device to router.
 
         The same device can not be added twice.
+        A device connected to another router must be removed from it first.
         Each device should be assigned an unique IP address in the correct subnet.
 
         The method should return True if device was added, else False.
         """
-        if device in self.devices:
+        # A device belongs to one router at a time; the back-reference makes this check O(1)
+        if device.router is not None:
             return False
-        else:
-            device.set_ip_address(self.generate_ip_address())
-            self.devices.append(device)
-            return True
+        # A full subnet raises here, before the device is connected
+        ip_address = self.generate_ip_address()
+        device.router = self
+        try:
+            device.set_ip_address(ip_address)
+        except Exception:
+            device.router = None
+            raise
+        self.devices.append(device)
+        return True
 
     def remove_device(self, device: EndDevice) -> bool:
         """
@@ -155,6 +639,7 @@ class Router:
         for index, dev_from_list in enumerate(self.devices):
             if dev_from_list == device:
                 dev_from_list.set_ip_address("")
+                dev_from_list.router = None
                 del self.devices[index]
                 return True
         else:
@@ -171,12 +656,45 @@ class Router:
         If there is no device with given IP, then return None.
         Otherwise return the found device.
         """
-        device_ip_list = map(lambda device: device.get_ip_address(), self.devices)  # can use filter but I already did this....
-        for index, ip_from_list in enumerate(device_ip_list):
-            if ip_from_list == ip:
-                return self.devices[index]
-        else:
-            return None
+        return self.devices_by_ip.get(pack_ip(ip))
+
+    def update_device_ip(self, device: EndDevice, old_ip: str, new_ip: str) -> None:
+        """
+        Move a device to its new IP in the router's IP index.
+
+        Called by EndDevice.set_ip_address, so the index and the address pool always match the devices' IPs.
+        An empty IP means the device has no address and is not indexed.
+        The index is keyed by packed IPs, so packets can be delivered without parsing their destination.
+        An IP shared by several devices is indexed to the device that took it last, and its host
+        goes back to the address pool only when no device holds it anymore.
+        """
+        old_ip = pack_ip(old_ip)
+        new_ip = pack_ip(new_ip)
+        if self.devices_by_ip.get(old_ip) is device:
+            others = self.shared_ips.get(old_ip)
+            if others:
+                self.devices_by_ip[old_ip] = others.pop()
+                if not others:
+                    del self.shared_ips[old_ip]
+            else:
+                del self.devices_by_ip[old_ip]
+                old_host = self.host_of(old_ip)
+                if old_host is not None:
+                    self.address_pool.release(old_host)
+        elif device in self.shared_ips.get(old_ip, ()):
+            others = self.shared_ips[old_ip]
+            others.remove(device)
+            if not others:
+                del self.shared_ips[old_ip]
+        if new_ip != "":
+            holder = self.devices_by_ip.get(new_ip)
+            if holder is None:
+                new_host = self.host_of(new_ip)
+                if new_host is not None:
+                    self.address_pool.reserve(new_host)
+            elif holder is not device:
+                self.shared_ips.setdefault(new_ip, []).append(holder)
+            self.devices_by_ip[new_ip] = device
 
     def receive_packet(self, packet: Packet) -> None:
         """
@@ -185,10 +703,54 @@ class Router:
         If there is a device with the destination IP in this subnet then forward this packet to this device.
         Otherwise drop this packet. (don't do anything with it)
         """
-        device = self.get_device_by_ip(packet.destination_ip)
+        device = self.devices_by_ip.get(packet.destination)
+        if self.recorder is not None:
+            self.recorder.record(packet)
+        if self.stats is not None:
+            self.stats.count("packets_in")
+            self.stats.count("bytes_in", packet_size(packet))
+            self.stats.count("delivered" if device is not None else "dropped_unknown_device")
         if device is not None:
             device.add_packet(packet)
 
+    def is_broadcast(self, destination: str | int) -> bool:
+        """Check if a packed IP is the router's broadcast address. Plain routers have none."""
+        return False
+
+    def get_recipients(self, destination: str | int) -> list[EndDevice]:
+        """Get the devices that should receive a packet sent to the given packed IP."""
+        device = self.devices_by_ip.get(destination)
+        return [device] if device is not None else []
+
+    def receive_packets(self, packets: list[Packet]) -> None:
+        """
+        Receive many packets from the Internet at once.
+
+        Each packet is delivered as in receive_packet().
+        Recipients are looked up once per run of packets with the same destination IP
+        and every recipient gets the whole run with a single add_packets() call.
+        The packet objects are shared by all recipients, not copied.
+        """
+        if self.recorder is not None:
+            self.recorder.record_many(packets)
+        stats = self.stats
+        for destination, run in itertools.groupby(packets, key=operator.attrgetter("destination")):
+            recipients = self.get_recipients(destination)
+            if stats is not None:
+                run = list(run)
+                stats.count("packets_in", len(run))
+                stats.count("bytes_in", sum(map(packet_size, run)))
+                if not recipients:
+                    stats.count("dropped_no_recipients", len(run))
+                else:
+                    stats.count("delivered", len(run) * len(recipients))
+                    if self.is_broadcast(destination):
+                        stats.count("broadcasts", len(run))
+            if recipients:
+                run = list(run)
+                for device in recipients:
+                    device.add_packets(run)
+
 
 class IPv4AddressSpaceExhaustedException(Exception):
     """Raised when there are no more available IP addresses."""
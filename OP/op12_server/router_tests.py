@@ -0,0 +1,252 @@
+"""Test."""
+
+import time
+
+import pytest
+
+from router import AddressPool, EndDevice, IPv4AddressSpaceExhaustedException, Packet, Router
+
+
+def make_packet(content, id, sequence_number):
+    return Packet(content, "1.2.3.4", "192.168.0.2", id, sequence_number)
+
+
+def contents(device):
+    return [packet.content for packet in device.get_all_packets()]
+
+
+#Retention tests
+def test_fifo_byte_budget_evicts_oldest_packets():
+    device = EndDevice()
+    device.set_retention(max_bytes=10)
+    for number in range(1, 5):
+        device.add_packet(make_packet(str(number) * 4, 1, number))
+
+    assert contents(device) == ["3333", "4444"]
+    assert device.get_retention_stats() == {"packets": 2, "bytes": 8, "evicted_packets": 2, "evicted_bytes": 8}
+
+
+def test_fifo_byte_budget_with_add_packets():
+    device = EndDevice()
+    device.set_retention(max_bytes=6, policy="fifo")
+    device.add_packets([make_packet("ab", 1, 1), make_packet("cd", 1, 2), make_packet("ef", 2, 1), make_packet("gh", 2, 2)])
+
+    assert contents(device) == ["cd", "ef", "gh"]
+    assert list(device.packets_by_id) == [1, 2]
+    assert list(device.packets_by_id[1]) == [2]
+
+
+def test_set_retention_evicts_existing_packets():
+    device = EndDevice()
+    for number in range(1, 6):
+        device.add_packet(make_packet("x", 1, number))
+    device.set_retention(max_packets=2)
+
+    assert [packet.sequence_number for packet in device.get_all_packets()] == [4, 5]
+
+
+def test_lru_evicts_least_recently_used_message():
+    device = EndDevice()
+    device.set_retention(max_packets=4, policy="lru")
+    device.add_packets([make_packet("a", 1, 1), make_packet("b", 1, 2)])
+    device.add_packets([make_packet("c", 2, 1), make_packet("d", 2, 2)])
+    device.add_packet(make_packet("e", 1, 3))
+    device.add_packet(make_packet("f", 3, 1))
+
+    assert contents(device) == ["a", "b", "e", "f"]
+    assert 2 not in device.packets_by_id
+    assert device.get_retention_stats()["evicted_packets"] == 2
+
+
+def test_lru_packet_added_again_after_eviction():
+    device = EndDevice()
+    device.set_retention(max_packets=2, policy="lru")
+    shared = make_packet("s", 1, 1)
+    device.add_packet(shared)
+    device.add_packet(make_packet("a", 2, 1))
+    device.add_packet(make_packet("b", 3, 1))
+    device.add_packet(shared)
+
+    assert contents(device) == ["b", "s"]
+    device.add_packet(make_packet("c", 4, 1))
+    device.add_packet(make_packet("d", 5, 1))
+
+    assert contents(device) == ["c", "d"]
+    assert device.get_retention_stats() == {"packets": 2, "bytes": 2, "evicted_packets": 4, "evicted_bytes": 4}
+
+
+def test_lru_duplicated_packet_is_evicted_with_its_message():
+    device = EndDevice()
+    device.set_retention(max_packets=3, policy="lru")
+    duplicated = make_packet("d", 1, 1)
+    device.add_packets([duplicated, duplicated])
+    device.add_packet(make_packet("a", 2, 1))
+    device.add_packet(make_packet("b", 3, 1))
+
+    assert contents(device) == ["a", "b"]
+    assert device.duplicate_packets == 1
+
+    device.add_packet(duplicated)
+    assert contents(device) == ["a", "b", "d"]
+
+
+def test_lru_shared_packet_on_two_devices():
+    lru_device = EndDevice()
+    lru_device.set_retention(max_packets=1, policy="lru")
+    fifo_device = EndDevice()
+    fifo_device.set_retention(max_packets=2)
+    shared = [make_packet("x", 1, 1), make_packet("y", 2, 1)]
+    for device in (lru_device, fifo_device):
+        device.add_packets(shared)
+
+    assert contents(lru_device) == ["y"]
+    assert contents(fifo_device) == ["x", "y"]
+
+
+def test_lru_many_evictions_keep_history_consistent():
+    device = EndDevice()
+    device.set_retention(max_packets=10, policy="lru")
+    for id in range(1, 1001):
+        device.add_packets([make_packet("p", id, 1), make_packet("q", id, 2)])
+
+    assert [(packet.id, packet.sequence_number) for packet in device.get_all_packets()] == \
+        [(id, number) for id in range(996, 1001) for number in (1, 2)]
+    assert len(device.packets) <= 20
+    assert device.get_retention_stats()["packets"] == 10
+
+
+def test_ttl_evicts_expired_packets(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    device = EndDevice()
+    device.set_retention(policy="ttl", ttl=5)
+    device.add_packet(make_packet("old", 1, 1))
+    now[0] = 103.0
+    device.add_packet(make_packet("new", 2, 1))
+
+    now[0] = 105.0
+    assert contents(device) == ["new"]
+    now[0] = 108.0
+    assert contents(device) == []
+    assert device.get_retention_stats()["evicted_packets"] == 2
+
+
+def test_ttl_policy_needs_ttl():
+    with pytest.raises(ValueError):
+        EndDevice().set_retention(policy="ttl")
+
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        EndDevice().set_retention(policy="random")
+
+
+def test_retention_stats_after_clear_packet_history():
+    device = EndDevice()
+    device.set_retention(max_packets=2, max_bytes=100, policy="lru")
+    for id in range(1, 5):
+        device.add_packet(make_packet("abc", id, 1))
+    device.clear_packet_history()
+
+    assert device.get_retention_stats() == {"packets": 0, "bytes": 0, "evicted_packets": 2, "evicted_bytes": 6}
+    device.add_packet(make_packet("abc", 5, 1))
+    assert device.get_retention_stats() == {"packets": 1, "bytes": 3, "evicted_packets": 2, "evicted_bytes": 6}
+    assert contents(device) == ["abc"]
+
+
+def test_unbounded_retention_stats():
+    device = EndDevice()
+    device.add_packets([make_packet("ab", 1, 1), make_packet("cde", 1, 2)])
+
+    assert device.get_retention_stats() == {"packets": 2, "bytes": 5, "evicted_packets": 0, "evicted_bytes": 0}
+
+
+#AddressPool tests
+def test_address_pool_allocates_lowest_free_host():
+    pool = AddressPool(2, 6)
+
+    assert [pool.allocate() for _ in range(3)] == [2, 3, 4]
+    pool.release(3)
+    assert pool.peek() == 3
+    assert pool.allocate() == 3
+    assert len(pool) == 2
+
+
+def test_address_pool_reserve_out_of_order():
+    pool = AddressPool(2, 6)
+    pool.reserve(4)
+    pool.reserve(2)
+
+    assert pool.allocate_many(2) == [3, 5]
+    assert len(pool) == 1
+    pool.reserve(6)
+    assert len(pool) == 0
+
+
+def test_address_pool_exhausted():
+    pool = AddressPool(2, 3)
+    pool.allocate_many(2)
+
+    with pytest.raises(IPv4AddressSpaceExhaustedException):
+        pool.allocate()
+
+
+def test_address_pool_allocate_many_takes_nothing_if_too_few():
+    pool = AddressPool(2, 4)
+
+    with pytest.raises(IPv4AddressSpaceExhaustedException):
+        pool.allocate_many(4)
+    assert len(pool) == 3
+
+
+def test_address_pool_ignores_hosts_outside_range():
+    pool = AddressPool(2, 4)
+    pool.reserve(10)
+    pool.release(1)
+    pool.release(3)
+
+    assert len(pool) == 3
+    assert pool.allocate() == 2
+
+
+def test_router_reuses_ip_of_removed_device():
+    router = Router("192.168.6.1")
+    devices = [EndDevice() for _ in range(3)]
+    for device in devices:
+        router.add_device(device)
+    router.remove_device(devices[1])
+    new_device = EndDevice()
+    router.add_device(new_device)
+
+    assert new_device.get_ip_address() == "192.168.6.3"
+
+
+def test_router_full_subnet_leaves_device_unconnected():
+    router = Router("10.0.0.1/30")
+    router.add_device(EndDevice())
+    device = EndDevice()
+
+    with pytest.raises(IPv4AddressSpaceExhaustedException):
+        router.add_device(device)
+    assert device.router is None
+    assert Router("10.0.1.1").add_device(device)
+
+
+def test_router_shared_ip_stays_taken_until_last_holder_leaves():
+    router = Router("192.168.6.1")
+    first, second = EndDevice(), EndDevice()
+    router.add_device(first)
+    router.add_device(second)
+    first.set_ip_address(second.get_ip_address())
+    router.remove_device(first)
+    new_devices = [EndDevice(), EndDevice()]
+    for device in new_devices:
+        router.add_device(device)
+
+    assert [device.get_ip_address() for device in new_devices] == ["192.168.6.2", "192.168.6.4"]
+    assert router.get_device_by_ip("192.168.6.3") is second
+
+    router.remove_device(second)
+    third = EndDevice()
+    router.add_device(third)
+    assert third.get_ip_address() == "192.168.6.3"
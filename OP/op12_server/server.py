@@ -1,7 +1,10 @@
 """Serve all the packets."""
 
-from router import Packet, EndDevice, Router
-import re
+import time
+
+from delivery import MessageDelivery
+from router import Packet, EndDevice, Router, IPv4AddressSpaceExhaustedException, packet_size
+from ipv4 import int_to_ip, ip_to_int, is_valid_ipv4, pack_ip
 
 
 class EndDevicePlus(EndDevice):
@@ -27,29 +30,60 @@ class EndDevicePlus(EndDevice):
 
         If some packets have been lost (such as there being packets 1 and 3, but not packet 2),
         then add an underscore (_) in place of each missing packet.
-        """
-        packets_with_id = self.get_all_packets_by_id(id)
 
-        if not packets_with_id:
+        Packets are already bucketed by ID and sequence number as they arrive,
+        so only the slots of this message are read and nothing has to be sorted.
+        Only packets kept by the device's retention limits are used.
+
+        Messages with duplicate packets or sequence numbers below 1 (see EndDevice.add_packet) are
+        reassembled from all of their packets instead, sorted by sequence number: every duplicate's
+        content is included and packets numbered below 1 come first.
+
+        Messages sent as bytes are returned as bytes, byte-identical to the sent message,
+        with b"_" in place of each missing packet.
+        """
+        if self.ttl is not None:
+            self.evict()
+        if id in self.recent_ids:
+            self.recent_ids.move_to_end(id)
+        if id in self.irregular_ids:
+            return self.reassemble(self.get_all_packets_by_id(id))
+        slots = self.packets_by_id.get(id)
+
+        if not slots:
             return ""
 
-        # Sort by sequence number
-        packets_with_id.sort(key=lambda packet: packet.sequence_number)
+        last_sequence_number = max(slots)
+        if self.stats is not None:
+            self.stats.count("messages_read")
+            self.stats.count("reassembly_gaps", last_sequence_number - sum(1 for number in slots if number >= 1))
+
+        # Missing sequence numbers become underscores
+        empty, gap = ("", "_") if isinstance(next(iter(slots.values())).content, str) else (b"", b"_")
+        return empty.join(slots[sequence_number].content if sequence_number in slots else gap
+                          for sequence_number in range(1, last_sequence_number + 1))
+
+    def reassemble(self, packets: list[Packet]) -> str | bytes:
+        """
+        Join the contents of packets in the order of their sequence numbers, keeping every packet.
+
+        An underscore is added for every sequence number missing before a packet.
+        """
+        if not packets:
+            return ""
 
-        # Determine the sequence numbers present and construct the message
+        packets.sort(key=lambda packet: packet.sequence_number)
+        empty, gap = ("", "_") if isinstance(packets[0].content, str) else (b"", b"_")
         message = []
         expected_sequence = 1
-
-        for packet in packets_with_id:
+        for packet in packets:
             # Add underscores for missing sequence numbers
             while expected_sequence < packet.sequence_number:
-                message.append("_")
+                message.append(gap)
                 expected_sequence += 1
-            # Add the packet's content
             message.append(packet.content)
             expected_sequence += 1
-
-        return "".join(message)
+        return empty.join(message)
 
 
 class RouterPlus(Router):
@@ -68,26 +102,53 @@ class RouterPlus(Router):
         Receive a packet from the Internet with additional functionality.
 
         If packet's destination IP ends with .255, it is broadcasted to every known device on the router.
+        In subnets other than /24, the broadcast IP is the last IP of the subnet.
         In other cases, the packet is handled as in the base Router class (using super()).
 
         Only packets in the same subnet as the router are processed.
         """
         # Check if the packet's destination is in the router's subnet
-        packet_subnet = ".".join(packet.destination_ip.split(".")[:3])  # 188.198.199
-        router_subnet = ".".join(self.ip_list[:3])
-
-        if packet_subnet != router_subnet:
+        destination = packet.destination
+        if not isinstance(destination, int) or destination & self.mask != self.network:
+            if self.recorder is not None:
+                self.recorder.record(packet)
+            if self.stats is not None:
+                self.stats.count("packets_in")
+                self.stats.count("bytes_in", packet_size(packet))
+                self.stats.count("dropped_other_subnet")
             return None
 
         # If the destination IP === .255, broadcast the packet
-        destination_ip_final_part = ".".join(packet.destination_ip.split(".")[3:])
-        if destination_ip_final_part == "255":
+        if destination == self.broadcast:
+            if self.recorder is not None:
+                self.recorder.record(packet)
+            if self.stats is not None:
+                self.stats.count("packets_in")
+                self.stats.count("bytes_in", packet_size(packet))
+                self.stats.count("broadcasts")
+                self.stats.count("delivered", len(self.devices))
             for device in self.devices:
                 device.add_packet(packet)
         else:
             # Handle the packet as in the base Router class
             super().receive_packet(packet)
 
+    def is_broadcast(self, destination: str | int) -> bool:
+        """Check if a packed IP is the router's broadcast address, the last IP of the subnet."""
+        return destination == self.broadcast
+
+    def get_recipients(self, destination: str | int) -> list[EndDevice]:
+        """
+        Get the devices that should receive a packet sent to the given packed IP.
+
+        IPs outside the router's subnet have no recipients and the broadcast IP reaches every device.
+        """
+        if not isinstance(destination, int) or destination & self.mask != self.network:
+            return []
+        if destination == self.broadcast:
+            return self.devices
+        return super().get_recipients(destination)
+
     def restart_router(self) -> None:
         """
         Restart the router.
@@ -95,48 +156,105 @@ class RouterPlus(Router):
         Upon restarting the router, all devices get new IP addresses.
         The new IP addresses must be unique and cannot be the same as the devices' previous IP addresses.
         The order of devices must not change.
-        """
-        devices_copy = []
-        old_ips = []  # Store old IP to check
-        new_ips = set()
 
-        # Reassign new IP
-        for device in self.devices:
-            old_ip = device.get_ip_address()
-            old_ips.append(old_ip)
+        The new assignment is computed in one linear pass:
+        the first devices get free addresses from the address pool, which no device has used before.
+        When the pool runs out, the remaining devices rotate their old addresses,
+        each taking the old address of the next one, so no device keeps its own address.
 
-            ip_last_part = 2
-            while True:
-                try:
-                    new_ip = self.generate_ip_address(ip_last_part)
-                    if new_ip not in old_ips and new_ip not in new_ips:
-                        break
-                    ip_last_part += 1  # Increment if collision detected
-                except IPv4AddressSpaceExhaustedException:
-                    raise RuntimeError("Unable to generate enough unique IP addresses.")
-
-            device.set_ip_address(new_ip)
-            devices_copy.append(device)
+        :raises IPv4AddressSpaceExhaustedException: If the devices can not all get a new address.
+        """
+        free_count = min(len(self.address_pool), len(self.devices))
+        if len(self.devices) - free_count == 1 and free_count > 0:
+            # A single device can not rotate, so it shares the rotation with the device before it
+            free_count -= 1
+        rotated_devices = self.devices[free_count:]
+        old_hosts = [self.host_of(pack_ip(device.get_ip_address())) for device in rotated_devices]
+        if len(rotated_devices) == 1 or None in old_hosts:
+            raise IPv4AddressSpaceExhaustedException()
 
-        self.devices = devices_copy
+        new_hosts = self.address_pool.allocate_many(free_count) + old_hosts[1:] + old_hosts[:1]
+        for device, host in zip(self.devices, new_hosts):
+            device.set_ip_address(int_to_ip(self.network + host))
 
 
 def validate_ipv4(ip_address: str) -> bool:
     """Validate IPv4."""
-    pattern_ip = r"((\d|[1-9]\d|1\d\d|2[0-4]\d|25[0-5])\.(\d|[1-9]\d|1\d\d|2[0-4]\d|25[0-5])\.(\d|[1-9]\d|1\d\d|2[0-4]\d|25[0-5])\.(\d|[1-9]\d|1\d\d|2[0-4]\d|25[0-5]))"
-    match = re.fullmatch(pattern_ip, ip_address)
-    return match is not None
+    return is_valid_ipv4(ip_address)
+
+
+class RoutingTable:
+    """
+    Routing table with longest prefix match.
+
+    Networks are stored in one dictionary per prefix length, keyed by the network part of the IP as an integer.
+    A lookup tries the known prefix lengths from the longest to the shortest,
+    so it is a single dictionary lookup when all routers have the same prefix length.
+    """
+
+    def __init__(self):
+        """Initialize an empty routing table."""
+        self.networks = {}
+        self.prefix_lengths = []
+
+    def add(self, ip_address: int, prefix_length: int, router: Router) -> None:
+        """Route the network of the given IP and prefix length to the router."""
+        if prefix_length not in self.networks:
+            self.networks[prefix_length] = {}
+            self.prefix_lengths = sorted(self.networks, reverse=True)
+        self.networks[prefix_length][ip_address >> (32 - prefix_length)] = router
+
+    def remove(self, ip_address: int, prefix_length: int) -> None:
+        """Stop routing the network of the given IP and prefix length."""
+        networks = self.networks.get(prefix_length, {})
+        networks.pop(ip_address >> (32 - prefix_length), None)
+        if not networks and prefix_length in self.networks:
+            del self.networks[prefix_length]
+            self.prefix_lengths = sorted(self.networks, reverse=True)
+
+    def lookup(self, ip_address: int) -> Router | None:
+        """Return the router with the longest prefix matching the IP, or None if no router matches."""
+        for prefix_length in self.prefix_lengths:
+            router = self.networks[prefix_length].get(ip_address >> (32 - prefix_length))
+            if router is not None:
+                return router
+        return None
 
 
 class Server:
     """Server class."""
 
-    def __init__(self):
-        """Initialize server."""
+    def __init__(self, mtu: int = 5):
+        """
+        Initialize server.
+
+        The MTU is the maximum content length of a packet:
+        symbols for string messages and bytes for bytes messages.
+
+        :raises ValueError: If the MTU is smaller than 1.
+        """
+        if mtu < 1:
+            raise ValueError(f"The MTU must be at least 1, not {mtu}.")
         self.ip_address = ""
         self.routers = {}
-
-    def split_message(self, message: str) -> list[str]:
+        self.routing_table = RoutingTable()
+        self.link = None
+        self.stats = None
+        self.recorder = None
+        self.mtu = mtu
+        self.deliveries = {}
+
+    def __getstate__(self) -> dict:
+        """Pickle the server without its recorder: the recorder writes to a file opened by this process."""
+        state = self.__dict__.copy()
+        state["recorder"] = None
+        return state
+
+    def get_path_mtu(self, router: Router) -> int:
+        """Get the MTU for packets sent to the given router: the smaller of the server's and the router's MTU."""
+        return self.mtu if router.mtu is None else min(self.mtu, router.mtu)
+
+    def split_message(self, message: str | bytes, mtu: int = None) -> list[str] | list[memoryview]:
         """
         Split message into smaller pieces.
 
@@ -149,10 +267,24 @@ class Server:
         If the message is exactly 5 symbols or less then just return the message in a list.
         Example:
             "Hello World" -> ["Hello", " Worl", "d"]
+
+        The piece length is the given mtu, or the server's MTU (5 by default).
+        Bytes-like messages (such as encoded text) are split into memoryview slices of the message,
+        so even megabyte messages are split without copying any piece.
+        The slices share the message's buffer. A device holding a single packet keeps the whole message
+        in memory, and changes to a bytearray message after sending show in the delivered packets.
+        Devices with a byte budget (see EndDevice.set_retention()) store a copy of each piece instead.
         """
+        if mtu is None:
+            mtu = self.mtu
+
+        if not isinstance(message, str):
+            view = memoryview(message).cast("B")
+            return [view[i:i + mtu] for i in range(0, len(view), mtu)]
+
         result_list = []
-        for i in range(0, len(message), 5):
-            split_message = message[i:i + 5]
+        for i in range(0, len(message), mtu):
+            split_message = message[i:i + mtu]
             result_list.append(split_message)
 
         return result_list
@@ -165,9 +297,9 @@ class Server:
         A Server's IP cannot end with 0 (network identifier), 1 (router) or 255 (broadcast).
         If given IP is not a valid IP, do not modify the current IP address.
         """
-        if validate_ipv4(ip_address):
-            last_ip_numbers = int(ip_address.split(".")[-1])
-            if last_ip_numbers not in {0, 1, 255}:
+        value = ip_to_int(ip_address)
+        if value is not None:
+            if value & 255 not in {0, 1, 255}:
                 self.ip_address = ip_address
         else:
             return None
@@ -183,10 +315,14 @@ class Server:
         Same router can not be added to the server multiple times.
 
         The method should return True if a router was added to the server, else False.
+
+        Routers are keyed by their subnet like in the routing table, so "10.0.0.1/24" and "10.0.0.1/16"
+        are different routers, and the more specific one gets the packets of its subnet.
         """
-        ip_address = router.get_ip_address()
-        if ip_address not in self.routers:
-            self.routers[ip_address] = router
+        key = (router.network, router.prefix_length)
+        if key not in self.routers:
+            self.routers[key] = router
+            self.routing_table.add(router.network, router.prefix_length, router)
             return True
         return False
 
@@ -199,12 +335,25 @@ class Server:
 
         The method should return True if a router was removed from the server, else False.
         """
-        ip_address = router.get_ip_address()
-        if ip_address in self.routers:
-            del self.routers[ip_address]
+        key = (router.network, router.prefix_length)
+        if key in self.routers:
+            del self.routers[key]
+            self.routing_table.remove(router.network, router.prefix_length)
             return True
         return False
 
+    def set_link(self, link) -> None:
+        """
+        Put a link between the server and its routers, such as a LossyLink.
+
+        The link's send(router, packets) method is then used to deliver packets to the routers.
+        Setting the link to None delivers packets directly again.
+        Links with an on_drop attribute report the packets they lose to the deliveries of their messages.
+        """
+        self.link = link
+        if hasattr(link, "on_drop"):
+            link.on_drop = self.report_drop
+
     def get_routers(self) -> list[Router]:
         """Get all routers that are connected to the server in the order they were connected."""
         return list(self.routers.values())
@@ -218,21 +367,57 @@ class Server:
 
         If there are no suitable routers or the IP address is invalid, drop the packet (do not send it).
         Also, packet should be dropped if packet's content size is over the limit (5 symbols).
+        The limit is the server's MTU, or the router's MTU if that is smaller.
 
         If you find a router with the same subnet as the target IP, you can use that router's
         receive_packet() method to handle the rest of the delivery.
-        """
-        if len(packet.content) > 5:
-            return None
-
-        target_ip = ".".join(packet.destination_ip.split(".")[:3])
-        for router in self.routers.values():
-            router_ip_full = router.get_ip_address()
-            router_ip = ".".join(router_ip_full.split(".")[:3])
-            if router_ip == target_ip:
-                router.receive_packet(packet)
 
-    def send_message_to_ip(self, message: str, ip_address: str, id: int) -> None:
+        The router is found with a single lookup in the server's routing table.
+        If the server has a recorder, every packet is recorded before it is routed or dropped.
+        """
+        if self.recorder is not None:
+            self.recorder.record(packet)
+        if len(packet.content) > self.mtu:
+            return self.drop_packet(packet, "dropped_oversize")
+
+        if not isinstance(packet.destination, int):
+            return self.drop_packet(packet, "dropped_invalid_ip")
+
+        router = self.routing_table.lookup(packet.destination)
+        if router is None:
+            return self.drop_packet(packet, "dropped_unknown_subnet")
+        if router.mtu is not None and len(packet.content) > router.mtu:
+            return self.drop_packet(packet, "dropped_oversize")
+
+        if self.stats is not None:
+            self.stats.count("packets_out")
+            self.stats.count("bytes_out", packet_size(packet))
+            start = time.perf_counter()
+        if self.link is not None:
+            self.link.send(router, [packet])
+        else:
+            router.receive_packet(packet)
+        if self.stats is not None:
+            self.stats.observe("hop_seconds", time.perf_counter() - start)
+
+    def count_drop(self, reason: str, packet_count: int) -> None:
+        """Count dropped packets under the given reason, if stats are enabled."""
+        if self.stats is not None:
+            self.stats.count(reason, packet_count)
+
+    def drop_packet(self, packet: Packet, reason: str) -> None:
+        """Count a packet dropped by the server and report it to the delivery of its message."""
+        self.count_drop(reason, 1)
+        self.report_drop(packet)
+
+    def report_drop(self, packet: Packet) -> None:
+        """Report a dropped packet to the delivery of its message, if the message is being tracked."""
+        if self.deliveries:
+            delivery = self.deliveries.get((packet.destination, packet.id))
+            if delivery is not None:
+                delivery.drop(packet.sequence_number)
+
+    def send_message_to_ip(self, message: str, ip_address: str, id: int, track: bool = False) -> MessageDelivery | None:
         """
         Send message to given IP addess.
 
@@ -243,26 +428,137 @@ class Server:
         This ID has to be used in the packets.
 
         You should use send_packet_to_ip() method here.
+
+        The message is split with the MTU of the path to the destination's router.
+
+        With track set, return a MessageDelivery future that resolves when every device the message is sent to
+        holds all of its packets, or fails with the sequence numbers of the packets dropped on the way.
+        Messages to IPs without a device have every packet dropped. Otherwise nothing is tracked and None is returned.
         """
-        parts = self.split_message(message)
+        source, destination = pack_ip(self.ip_address), pack_ip(ip_address)
+        router = self.routing_table.lookup(destination) if isinstance(destination, int) else None
+        parts = self.split_message(message, self.mtu if router is None else self.get_path_mtu(router))
+        delivery = self.track_delivery(id, ip_address, router, len(parts)) if track else None
+
         for sequence_number, part in enumerate(parts, start=1):  # sequence_number starts with 1
-            new_packet = Packet(part, self.ip_address, ip_address, id, sequence_number)
+            new_packet = Packet(part, source, destination, id, sequence_number)
             self.send_packet_to_ip(new_packet)
 
+        if delivery is not None:
+            delivery.sent()
+        return delivery
+
+    def track_delivery(self, id: int, ip_address: str, router: Router | None, packet_count: int) -> MessageDelivery:
+        """
+        Start tracking the delivery of a message that is about to be sent.
+
+        A tracked delivery of an earlier message with the same ID and IP is cancelled, as drops
+        could not be told apart. An empty message has no packets to wait for, so its delivery
+        resolves as soon as it is sent. Deliveries stop being tracked once they resolve, fail or are cancelled.
+        """
+        destination = pack_ip(ip_address)
+        recipients = router.get_recipients(destination) if router is not None else []
+        delivery = MessageDelivery(id, ip_address, packet_count, recipients)
+        delivery.add_done_callback(self.forget_delivery)
+        if not recipients:
+            for sequence_number in range(1, packet_count + 1):
+                delivery.drop(sequence_number)
+
+        key = (destination, id)
+        if key in self.deliveries:
+            self.deliveries[key].cancel()
+        self.deliveries[key] = delivery
+        if packet_count:
+            for device in recipients:
+                device.expect_message(id, packet_count, delivery.message_arrived)
+        return delivery
+
+    def forget_delivery(self, delivery: MessageDelivery) -> None:
+        """Stop tracking a resolved, failed or cancelled delivery."""
+        key = (pack_ip(delivery.ip_address), delivery.id)
+        if self.deliveries.get(key) is delivery:
+            del self.deliveries[key]
+        delivery.release()
+
+    def expire_deliveries(self, timeout: float) -> int:
+        """
+        Fail the tracked deliveries sent more than timeout seconds ago with a TimeoutError.
+
+        Their packets were lost where the server cannot see it, for example as duplicates dropped by a device.
+        Return the number of expired deliveries.
+        """
+        deadline = time.monotonic() - timeout
+        expired = [delivery for delivery in self.deliveries.values() if delivery.sent_at <= deadline]
+        for delivery in expired:
+            delivery.expire()
+        return len(expired)
+
     def send_message_to_all(self, message: str, id: int) -> None:
         """
         Send message to every known router and to every end device on these routers.
 
         You should use send_message_to_ip() method here.
         Sending to every end device should be handled by the router.
+
+        Routers that support broadcast get the message once, sent to their broadcast address,
+        and share the same packets with all of their devices.
+        Other routers get the message separately for every device.
         """
+        batch = []
         for router in self.get_routers():
-            for device in router.get_devices():
-                self.send_message_to_ip(message, device.get_ip_address(), id)
-
+            if isinstance(router, RouterPlus):
+                if self.stats is not None:
+                    self.stats.count("broadcasts")
+                batch.append((message, router.get_broadcast_address(), id))
+            else:
+                batch.extend((message, device.get_ip_address(), id) for device in router.get_devices())
+        self.send_messages(batch)
+
+    def send_messages(self, batch: list[tuple[str, str, int]]) -> None:
+        """
+        Send many messages at once.
 
-class IPv4AddressSpaceExhaustedException(Exception):
-    """Raised when there are no more available IP addresses."""
+        The batch is a list of (message, ip_address, id) tuples, each handled like send_message_to_ip().
+        Messages are split with the MTU of the path to their router.
+        Messages to unknown subnets or invalid IPs are split with the server's MTU, recorded and dropped.
+        The router of every destination IP is resolved once per batch and all packets of a message
+        are delivered with a single call to the router's receive_packets() method.
+        """
+        source = pack_ip(self.ip_address)
+        routes = {}
+        for message, ip_address, id in batch:
+            destination = pack_ip(ip_address)
+            if destination in routes:
+                router = routes[destination]
+            else:
+                router = routes[destination] = self.routing_table.lookup(destination) if isinstance(destination, int) else None
+            if router is None:
+                if self.recorder is not None or self.stats is not None:
+                    # Like send_packet_to_ip(), dropped packets are recorded before they are dropped
+                    parts = self.split_message(message)
+                    if self.recorder is not None:
+                        self.recorder.record_many([Packet(part, source, destination, id, sequence_number)
+                                                   for sequence_number, part in enumerate(parts, start=1)])
+                    if self.stats is not None:
+                        reason = "dropped_unknown_subnet" if isinstance(destination, int) else "dropped_invalid_ip"
+                        self.count_drop(reason, len(parts))
+                continue
+
+            packets = [Packet(part, source, destination, id, sequence_number)
+                       for sequence_number, part in enumerate(self.split_message(message, self.get_path_mtu(router)),
+                                                              start=1)]
+            if self.recorder is not None:
+                self.recorder.record_many(packets)
+            if self.stats is not None:
+                self.stats.count("packets_out", len(packets))
+                self.stats.count("bytes_out", sum(map(packet_size, packets)))
+                start = time.perf_counter()
+            if self.link is not None:
+                self.link.send(router, packets)
+            else:
+                router.receive_packets(packets)
+            if self.stats is not None:
+                self.stats.observe("hop_seconds", time.perf_counter() - start)
 
 
 if __name__ == "__main__":
@@ -349,3 +645,8 @@ if __name__ == "__main__":
     print(device1.get_message(1337))    # All your files have been encrypted!
     print(device4.get_message(1337))    # All your files have been encrypted!
     print()
+
+    # Sending a tracked message returns a future of its delivery
+    delivery = server.send_message_to_ip("tracked", device3.get_ip_address(), 7, track=True)
+    print(delivery.result() == [device3])                                               # True
+    print(server.send_message_to_ip("lost", "10.0.0.99", 8, track=True).exception())    # Message 8 to 10.0.0.99 lost packets [1]
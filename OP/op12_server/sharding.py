@@ -0,0 +1,220 @@
+"""Run the network on several processes."""
+
+import multiprocessing
+import traceback
+
+from ipv4 import ip_to_int
+from router import Router
+from server import RoutingTable, Server
+
+
+class ShardError(Exception):
+    """Raised by a query of the sharded server when a worker failed to execute a command."""
+
+
+def run_shard(connection, server_ip: str, routers: list[Router]) -> None:
+    """
+    Serve the routers of one shard in a worker process.
+
+    The shard has its own Server with the given routers and executes the commands it receives over the connection.
+    Every command is a (name, args) tuple. Commands ending with "?" are queries and get their result sent back.
+
+    A failing command does not stop the worker. Its error is sent back as a ShardError with the worker's
+    traceback instead of the answer to the failing query, or to the next query if the command was not a query.
+    """
+    server = Server()
+    server.set_ip_address(server_ip)
+    for router in routers:
+        server.add_router(router)
+
+    error = None
+    while True:
+        name, args = connection.recv()
+        if name == "stop":
+            break
+        try:
+            result = execute_shard_command(server, name, args)
+            if name.endswith("?") and error is None:
+                connection.send(result)
+        except Exception:
+            error = error or ShardError(f"Shard command {name} failed:\n{traceback.format_exc()}")
+        if name.endswith("?") and error is not None:
+            connection.send(error)
+            error = None
+    connection.close()
+
+
+def execute_shard_command(server: Server, name: str, args: tuple):
+    """Execute a command of the sharded server on the server of a shard and return the result of queries."""
+    if name == "send_messages":
+        server.send_messages(*args)
+    elif name == "send_message_to_all":
+        server.send_message_to_all(*args)
+    elif name == "get_messages?":
+        id, = args
+        return {device.get_ip_address(): message
+                for router in server.get_routers()
+                for device in router.get_devices()
+                if (message := device.get_message(id))}
+    elif name == "get_routers?":
+        return server.get_routers()
+    else:
+        raise ValueError(f"Unknown shard command {name}")
+
+
+class ShardedServer:
+    """
+    Server whose routers are spread over several worker processes.
+
+    Every subnet belongs to exactly one shard: the i-th router of the server goes to shard i % shard_count.
+    Every shard runs its own Server in a worker process, so the shards deliver packets in parallel.
+
+    Messages sent with send_messages() are routed to the shard that owns the destination subnet.
+    They are buffered per shard and sent over a pipe in batches of batch_size messages.
+    Queries such as get_messages() flush the buffers first and gather the answers of all shards.
+
+    The routers and devices live in the workers while the sharded server runs.
+    Changes to them are only visible through queries or after stop() returns them.
+    """
+
+    def __init__(self, server: Server, shard_count: int = None, batch_size: int = 10_000):
+        """Initialize the sharded server for the routers of the given server."""
+        self.server = server
+        self.shard_count = shard_count or multiprocessing.cpu_count()
+        self.batch_size = batch_size
+
+        self.shard_table = RoutingTable()
+        self.connections = []
+        self.processes = []
+        self.buffers = []
+
+    def __enter__(self) -> "ShardedServer":
+        """Start the worker processes."""
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        """Stop the worker processes."""
+        self.stop()
+
+    def start(self) -> None:
+        """Partition the routers and start one worker process per shard."""
+        shards = [[] for _ in range(self.shard_count)]
+        for index, router in enumerate(self.server.get_routers()):
+            shard = index % self.shard_count
+            shards[shard].append(router)
+            self.shard_table.add(ip_to_int(router.get_ip_address()), router.prefix_length, shard)
+
+        for routers in shards:
+            parent_connection, child_connection = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=run_shard,
+                                              args=(child_connection, self.server.get_ip_address(), routers),
+                                              daemon=True)
+            process.start()
+            child_connection.close()
+            self.connections.append(parent_connection)
+            self.processes.append(process)
+            self.buffers.append([])
+
+    def stop(self) -> list[Router]:
+        """
+        Flush all buffered messages, stop the workers and return the routers with their delivered packets.
+
+        The returned routers are copies from the workers, in shard order.
+        The workers are stopped even if a shard fails to return its routers.
+        """
+        try:
+            routers = [router for shard_routers in self.query("get_routers?") for router in shard_routers]
+        finally:
+            for connection in self.connections:
+                try:
+                    connection.send(("stop", ()))
+                except (BrokenPipeError, OSError):
+                    pass
+            for process in self.processes:
+                process.join()
+            for connection in self.connections:
+                connection.close()
+            self.connections, self.processes, self.buffers = [], [], []
+            self.shard_table = RoutingTable()
+        return routers
+
+    def send_messages(self, batch: list[tuple[str, str, int]]) -> None:
+        """
+        Send many messages like Server.send_messages().
+
+        Every message goes to the buffer of the shard that owns its destination subnet.
+        Messages to unknown subnets or invalid IPs are dropped.
+        """
+        for item in batch:
+            destination = ip_to_int(item[1])
+            shard = None if destination is None else self.shard_table.lookup(destination)
+            if shard is None:
+                continue
+            buffer = self.buffers[shard]
+            buffer.append(item)
+            if len(buffer) >= self.batch_size:
+                self.flush_shard(shard)
+
+    def send_message_to_ip(self, message: str, ip_address: str, id: int) -> None:
+        """Send a message to the given IP address through its shard."""
+        self.send_messages([(message, ip_address, id)])
+
+    def send_message_to_all(self, message: str, id: int) -> None:
+        """Send a message to every device on every shard. Every shard broadcasts to its own routers in parallel."""
+        self.flush()
+        for connection in self.connections:
+            connection.send(("send_message_to_all", (message, id)))
+
+    def flush_shard(self, shard: int) -> None:
+        """Send the buffered messages of a shard to its worker."""
+        if self.buffers[shard]:
+            self.connections[shard].send(("send_messages", (self.buffers[shard],)))
+            self.buffers[shard] = []
+
+    def flush(self) -> None:
+        """Send the buffered messages of all shards to their workers."""
+        for shard in range(len(self.buffers)):
+            self.flush_shard(shard)
+
+    def query(self, name: str, *args) -> list:
+        """
+        Flush the buffers, ask every shard the same query and return the answers in shard order.
+
+        If a shard failed to execute this or an earlier command, its ShardError is raised
+        once all shards have answered.
+        """
+        self.flush()
+        for connection in self.connections:
+            connection.send((name, args))
+        answers = [connection.recv() for connection in self.connections]
+        for answer in answers:
+            if isinstance(answer, ShardError):
+                raise answer
+        return answers
+
+    def get_messages(self, id: int) -> dict[str, str]:
+        """Gather the message with the given ID from every device that received it, keyed by device IP."""
+        messages = {}
+        for shard_messages in self.query("get_messages?", id):
+            messages.update(shard_messages)
+        return messages
+
+
+if __name__ == "__main__":
+    """Main for testing the sharded server."""
+    from server import EndDevicePlus, RouterPlus
+
+    server = Server()
+    server.set_ip_address("1.2.3.4")
+    for i in range(4):
+        router = RouterPlus(f"10.0.{i}.1")
+        router.add_device(EndDevicePlus())
+        router.add_device(EndDevicePlus())
+        server.add_router(router)
+
+    with ShardedServer(server, shard_count=2) as sharded:
+        sharded.send_message_to_ip("pretty long message", "10.0.3.2", 1)
+        sharded.send_message_to_all("All your files have been encrypted!", 1337)
+        print(sharded.get_messages(1))                  # {'10.0.3.2': 'pretty long message'}
+        print(len(sharded.get_messages(1337)))          # 8
@@ -0,0 +1,189 @@
+"""Simulate the network with asyncio."""
+
+import asyncio
+
+from ipv4 import pack_ip
+from router import Packet, EndDevice, Router, packet_size
+from server import Server
+
+
+class AsyncNetwork:
+    """
+    Asynchronous network simulation.
+
+    Every router and every end device behind the server gets an inbound queue and a consumer task.
+    Packets travel server -> router -> device through these queues instead of direct method calls.
+
+    Every link has the same latency (seconds) and bandwidth (bytes per second, None for unlimited).
+    Latency is pipelined: a packet is handed over at once and becomes readable latency seconds later.
+    Bandwidth is serial: a consumer spends size / bandwidth seconds on every packet it takes.
+
+    Queues hold at most queue_size packets. When a queue is full, the sender waits until there is room (backpressure).
+    """
+
+    def __init__(self, server: Server, latency: float = 0.0, bandwidth: float = None, queue_size: int = 1000):
+        """Initialize the simulation for the routers and devices of the server."""
+        self.server = server
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.queue_size = queue_size
+
+        self.router_queues = {}
+        self.device_queues = {}
+        self.tasks = []
+        self.latencies = []
+        self.dropped = 0
+
+    async def __aenter__(self) -> "AsyncNetwork":
+        """Start the simulation."""
+        self.start()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        """Wait for all packets to be delivered and stop the simulation."""
+        await self.drain()
+        await self.stop()
+
+    def start(self) -> None:
+        """Create the queues and consumer tasks. Must be called from a running event loop."""
+        for router in self.server.get_routers():
+            self.get_router_queue(router)
+
+    async def stop(self) -> None:
+        """Cancel all consumer tasks. Packets still in the queues are lost."""
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        self.router_queues = {}
+        self.device_queues = {}
+
+    async def drain(self) -> None:
+        """Wait until every packet sent so far has been delivered or dropped."""
+        # Routers only mark a packet done after passing it on, so the device queues are complete afterwards
+        await asyncio.gather(*(queue.join() for queue in self.router_queues.values()))
+        await asyncio.gather(*(queue.join() for queue in self.device_queues.values()))
+
+    def get_router_queue(self, router: Router) -> asyncio.Queue:
+        """Get the inbound queue of a router, starting its consumer on first use."""
+        queue = self.router_queues.get(router)
+        if queue is None:
+            queue = self.router_queues[router] = asyncio.Queue(self.queue_size)
+            self.tasks.append(asyncio.create_task(self.run_router(router, queue)))
+        return queue
+
+    def get_device_queue(self, device: EndDevice) -> asyncio.Queue:
+        """Get the inbound queue of a device, starting its consumer on first use."""
+        queue = self.device_queues.get(device)
+        if queue is None:
+            queue = self.device_queues[device] = asyncio.Queue(self.queue_size)
+            self.tasks.append(asyncio.create_task(self.run_device(device, queue)))
+        return queue
+
+    async def transmit(self, ready_time: float, packet: Packet) -> None:
+        """Wait until a packet has crossed its link."""
+        loop = asyncio.get_running_loop()
+        delay = ready_time - loop.time()
+        if self.bandwidth is not None:
+            delay = max(delay, 0) + packet_size(packet) / self.bandwidth
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def run_router(self, router: Router, queue: asyncio.Queue) -> None:
+        """Take packets from a router's queue and pass them on to the router's devices."""
+        loop = asyncio.get_running_loop()
+        while True:
+            ready_time, sent_time, packet = await queue.get()
+            try:
+                await self.transmit(ready_time, packet)
+                recipients = router.get_recipients(packet.destination)
+                if not recipients:
+                    self.dropped += 1
+                ready_time = loop.time() + self.latency
+                for device in recipients:
+                    await self.get_device_queue(device).put((ready_time, sent_time, packet))
+            finally:
+                queue.task_done()
+
+    async def run_device(self, device: EndDevice, queue: asyncio.Queue) -> None:
+        """Take packets from a device's queue, deliver them and record their end-to-end latency."""
+        loop = asyncio.get_running_loop()
+        while True:
+            ready_time, sent_time, packet = await queue.get()
+            try:
+                await self.transmit(ready_time, packet)
+                device.add_packet(packet)
+                self.latencies.append(loop.time() - sent_time)
+            finally:
+                queue.task_done()
+
+    async def send_packet_to_ip(self, packet: Packet) -> None:
+        """
+        Send a packet like Server.send_packet_to_ip(), but through the router's queue.
+
+        Waits while the router's queue is full.
+        Packets longer than the MTU of the path to the router are dropped.
+        """
+        router = self.server.routing_table.lookup(packet.destination) if isinstance(packet.destination, int) else None
+        if router is None or len(packet.content) > self.server.get_path_mtu(router):
+            self.dropped += 1
+            return None
+
+        now = asyncio.get_running_loop().time()
+        await self.get_router_queue(router).put((now + self.latency, now, packet))
+
+    async def send_message_to_ip(self, message: str, ip_address: str, id: int) -> None:
+        """
+        Send a message like Server.send_message_to_ip(), packet by packet through the queues.
+
+        The message is split with the MTU of the path to the destination's router.
+        """
+        source, destination = pack_ip(self.server.get_ip_address()), pack_ip(ip_address)
+        router = self.server.routing_table.lookup(destination) if isinstance(destination, int) else None
+        parts = self.server.split_message(message, self.server.mtu if router is None else self.server.get_path_mtu(router))
+        for sequence_number, part in enumerate(parts, start=1):
+            await self.send_packet_to_ip(Packet(part, source, destination, id, sequence_number))
+
+    def get_latency_stats(self) -> dict:
+        """Return the number of delivered packets and the distribution of their end-to-end latencies in seconds."""
+        if not self.latencies:
+            return {"delivered": 0}
+
+        latencies = sorted(self.latencies)
+
+        def percentile(fraction: float) -> float:
+            return latencies[min(len(latencies) - 1, int(fraction * len(latencies)))]
+
+        return {
+            "delivered": len(latencies),
+            "min": latencies[0],
+            "p50": percentile(0.5),
+            "p90": percentile(0.9),
+            "p99": percentile(0.99),
+            "max": latencies[-1],
+            "mean": sum(latencies) / len(latencies),
+        }
+
+
+if __name__ == "__main__":
+    """Main for testing the simulation."""
+    from server import EndDevicePlus, RouterPlus
+
+    async def main():
+        """Send concurrent messages through a small network."""
+        server = Server()
+        server.set_ip_address("1.2.3.4")
+        router = RouterPlus("192.168.1.1")
+        devices = [EndDevicePlus() for _ in range(10)]
+        for device in devices:
+            router.add_device(device)
+        server.add_router(router)
+
+        async with AsyncNetwork(server, latency=0.001, bandwidth=1_000_000, queue_size=50) as network:
+            await asyncio.gather(*(network.send_message_to_ip("pretty long message", device.get_ip_address(), id)
+                                   for id, device in enumerate(devices)))
+
+        print(devices[3].get_message(3))       # pretty long message
+        print(network.get_latency_stats())     # 40 delivered packets and their latencies
+
+    asyncio.run(main())
@@ -0,0 +1,131 @@
+"""Count and export network traffic."""
+
+import collections
+import json
+import math
+import threading
+import time
+
+
+class Stats:
+    """
+    Traffic counters and histograms of one server, router or device.
+
+    Counters are plain named numbers, such as packets_in or dropped_oversize.
+    Histograms count observed values in power of two buckets, such as hop_seconds.
+
+    Components have stats set to None by default and skip all counting then.
+    """
+
+    def __init__(self):
+        """Initialize empty counters and histograms."""
+        self.counters = collections.Counter()
+        self.histograms = collections.defaultdict(collections.Counter)
+
+    def count(self, name: str, amount: int = 1) -> None:
+        """Add amount to a counter."""
+        self.counters[name] += amount
+
+    def observe(self, name: str, value: float) -> None:
+        """Count a value in the histogram with the given name. The bucket is the smallest power of two >= value."""
+        if value > 0:
+            mantissa, exponent = math.frexp(value)
+            # frexp gives value = mantissa * 2 ** exponent with 0.5 <= mantissa < 1, so powers of two have mantissa 0.5
+            self.histograms[name][exponent - 1 if mantissa == 0.5 else exponent] += 1
+        else:
+            self.histograms[name][None] += 1
+
+    def snapshot(self) -> dict:
+        """Return a copy of all counters and histograms. Histogram buckets are keyed by their upper bound."""
+        histograms = {}
+        for name, buckets in list(self.histograms.items()):
+            exponents = sorted(buckets, key=lambda exponent: -math.inf if exponent is None else exponent)
+            histograms[name] = {"0" if exponent is None else repr(2.0 ** exponent): buckets[exponent]
+                                for exponent in exponents}
+        return {"counters": dict(self.counters), "histograms": histograms}
+
+
+def enable_stats(server) -> None:
+    """Give the server, all of its routers and all of their devices their own Stats."""
+    server.stats = Stats()
+    for router in server.get_routers():
+        router.stats = Stats()
+        for device in router.get_devices():
+            device.stats = Stats()
+
+
+def disable_stats(server) -> None:
+    """Stop counting on the server, its routers and their devices."""
+    server.stats = None
+    for router in server.get_routers():
+        router.stats = None
+        for device in router.get_devices():
+            device.stats = None
+
+
+def collect_stats(server) -> dict:
+    """
+    Return a snapshot of the stats of the server, its routers and their devices.
+
+    Routers and devices are keyed by IP. Components without stats are left out.
+    """
+    snapshot = {"time": time.time(), "server": None, "routers": {}, "devices": {}}
+    if server.stats is not None:
+        snapshot["server"] = server.stats.snapshot()
+    for router in server.get_routers():
+        if router.stats is not None:
+            snapshot["routers"][router.get_ip_address()] = router.stats.snapshot()
+        for device in router.get_devices():
+            if device.stats is not None:
+                snapshot["devices"][device.get_ip_address()] = device.stats.snapshot()
+    return snapshot
+
+
+class JsonLinesExporter:
+    """
+    Write stats snapshots of a server to a file as JSON lines.
+
+    A background thread appends one collect_stats() snapshot every interval seconds until stop() is called.
+    """
+
+    def __init__(self, server, path: str, interval: float = 1.0):
+        """Initialize the exporter. Call start() to begin writing."""
+        self.server = server
+        self.path = path
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def __enter__(self) -> "JsonLinesExporter":
+        """Start writing snapshots."""
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        """Stop writing snapshots."""
+        self.stop()
+
+    def start(self) -> None:
+        """Start the background thread."""
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        """Stop the background thread after it has written one last snapshot."""
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def run(self) -> None:
+        """Write a snapshot every interval seconds and once more when stopped."""
+        with open(self.path, "a") as file:
+            while not self.stopped.wait(self.interval):
+                self.write(file)
+            self.write(file)
+
+    def write(self, file) -> None:
+        """Append one snapshot to the file."""
+        file.write(json.dumps(collect_stats(self.server)) + "\n")
+        file.flush()
@@ -0,0 +1,201 @@
+"""Benchmark the maze solver."""
+
+import heapq
+import random
+import time
+import tracemalloc
+
+from maze import MazeSolver, ShortestPathCache, numpy
+
+
+def random_maze(height: int, width: int, wall_ratio: float = 0.25, seed: int = 20, floors: str = "      ..-w") -> str:
+    """
+    Create a random maze string with doors on every other row of the left and right edges.
+
+    Cells are walls with probability wall_ratio and otherwise a random symbol of floors.
+    """
+    rng = random.Random(seed)
+    rows = []
+    for i in range(height):
+        row = [("#" if rng.random() < wall_ratio else rng.choice(floors)) for _ in range(width)]
+        row[0] = row[-1] = "|" if i % 2 else "#"
+        rows.append("".join(row))
+    return "\n".join(rows)
+
+
+def path_copying_shortest_path(solver: MazeSolver, start: tuple, goal: tuple) -> tuple:
+    """The former get_shortest_path(), which copied the path into every queue entry. Kept for comparison."""
+    visited = set()
+    pq = [(0, start[0], start[1], [])]
+
+    while pq:
+        current_cost, y, x, path = heapq.heappop(pq)
+        if (y, x) in visited:
+            continue
+        visited.add((y, x))
+        path = path + [(y, x)]
+        if (y, x) == goal:
+            return path, current_cost
+        for (ny, nx), move_cost in solver.get_neighbors(y, x):
+            if (ny, nx) not in visited:
+                heapq.heappush(pq, (current_cost + move_cost, ny, nx, path))
+
+    return None, -1
+
+
+def measure(function, *args) -> tuple[float, float]:
+    """Run a function twice: once for its runtime and once for its peak traced memory. Return both (seconds, MB)."""
+    start = time.perf_counter()
+    function(*args)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    function(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return elapsed, peak / 2 ** 20
+
+
+def bench_shortest_path(size: int, path_copying: bool = False) -> tuple[float, float]:
+    """
+    Find the shortest path from the top left door to the bottom right door of a random size x size maze.
+
+    The doors are on opposite corners, so the search visits almost every cell.
+    With path_copying set, the former path-copying search is measured instead.
+    Return the runtime in seconds and the peak memory in MB.
+    """
+    solver = MazeSolver(random_maze(size, size))
+    start, goal = solver.start_doors[0], solver.end_doors[-1]
+    if path_copying:
+        return measure(path_copying_shortest_path, solver, start, goal)
+    return measure(solver.get_shortest_path, start, goal)
+
+
+def bench_astar(size: int = 1000) -> dict:
+    """
+    Search a large open maze of plain cells with Dijkstra's algorithm and with A*.
+
+    Both a single pair of doors and all doors (solve()) are searched.
+    Return the runtime in seconds and the number of expanded cells for every search.
+    """
+    solver = MazeSolver(random_maze(size, size, wall_ratio=0.1, floors=" "))
+    start, goal = solver.start_doors[size // 20], solver.end_doors[size // 5]
+    results = {}
+    for astar in (False, True):
+        name = "A*" if astar else "Dijkstra"
+        for query, search in (("door pair", lambda: solver.get_shortest_path(start, goal, astar)),
+                              ("all doors", lambda: solver.solve(astar=astar))):
+            begin = time.perf_counter()
+            search()
+            results[f"{name} {query}"] = (time.perf_counter() - begin, solver.expanded_cells)
+    return results
+
+
+def bench_cached_queries(size: int = 300, query_count: int = 200, start_count: int = 8) -> dict:
+    """
+    Answer random shortest path queries from a few start cells, with and without a ShortestPathCache.
+
+    Door-to-door queries are also answered from a cache with precomputed door trees.
+    Return the number of queries per second for every case.
+    """
+    solver = MazeSolver(random_maze(size, size))
+    rng = random.Random(23)
+    cells = [(y, x) for y in range(size) for x in range(size) if solver.grid[(y + 1) * solver.stride + x + 1] >= 0]
+    starts = rng.sample(cells, start_count)
+    queries = [(rng.choice(starts), rng.choice(cells)) for _ in range(query_count)]
+    doors = solver.start_doors + solver.end_doors
+    door_queries = [(rng.choice(doors), rng.choice(doors)) for _ in range(query_count * 100)]
+
+    results = {}
+    start = time.perf_counter()
+    for query in queries:
+        solver.get_shortest_path(*query)
+    results["uncached"] = query_count / (time.perf_counter() - start)
+
+    cache = ShortestPathCache(solver, max_trees=start_count)
+    start = time.perf_counter()
+    for query in queries:
+        cache.get_shortest_path(*query)
+    results["cached"] = query_count / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    cache.precompute_doors()
+    results["door precomputation seconds"] = time.perf_counter() - start
+    start = time.perf_counter()
+    for query in door_queries:
+        cache.get_shortest_path(*query)
+    results["door to door"] = len(door_queries) / (time.perf_counter() - start)
+    return results
+
+
+def bench_locate(size: int = 1000, area_size: int = 10, unknown_ratio: float = 0.2) -> dict:
+    """
+    Locate an area cut out of a random size x size maze, with some of its cells unknown.
+
+    Return the runtime in seconds of the loop and the vectorized implementation,
+    or only of the loops if NumPy is not installed.
+    """
+    solver = MazeSolver(random_maze(size, size))
+    rng = random.Random(31)
+    top, left = rng.randrange(size - area_size), rng.randrange(size - area_size)
+    area = [["?" if rng.random() < unknown_ratio else solver.maze[top + i][left + j] for j in range(area_size)]
+            for i in range(area_size)]
+
+    results = {}
+    implementations = [("loops", solver.locate_with_loops)]
+    if numpy is not None:
+        solver.get_maze_codes()
+        implementations.append(("vectorized", solver.locate_vectorized))
+    for name, locate in implementations:
+        start = time.perf_counter()
+        locations = locate(area, 0, 0, "?")
+        results[name] = time.perf_counter() - start
+        assert (top, left) in locations
+    return results
+
+
+def bench_locate_index(size: int = 1000, area_size: int = 10, query_count: int = 1_000) -> dict:
+    """
+    Locate many different exact areas of a random size x size maze, with and without a locate index.
+
+    Return the seconds spent building the index and the number of located areas per second
+    with the index and without it.
+    """
+    solver = MazeSolver(random_maze(size, size))
+    rng = random.Random(37)
+    areas = []
+    for _ in range(query_count):
+        top, left = rng.randrange(size - area_size), rng.randrange(size - area_size)
+        areas.append("\n".join("".join(solver.maze[top + i][left:left + area_size]) for i in range(area_size)).strip())
+    areas = [area for area in areas if len(area) == area_size * (area_size + 1) - 1]
+
+    results = {}
+    unindexed = areas[:max(1, len(areas) // 50)]
+    start = time.perf_counter()
+    for area in unindexed:
+        solver.locate(area, 0, 0)
+    results["unindexed"] = len(unindexed) / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    solver.build_locate_index(area_size, area_size)
+    results["index seconds"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for area in areas:
+        solver.locate(area, 0, 0)
+    results["indexed"] = len(areas) / (time.perf_counter() - start)
+    return results
+
+
+if __name__ == "__main__":
+    """Run all benchmarks."""
+    for size, path_copying in ((600, True), (600, False), (2000, False)):
+        seconds, megabytes = bench_shortest_path(size, path_copying)
+        name = "path copying" if path_copying else "parent pointers"
+        print(f"shortest path {size}x{size} ({name}): {seconds:.2f} s, peak {megabytes:,.1f} MB")
+    for name, (seconds, expanded_cells) in bench_astar().items():
+        print(f"{name} on an open 1000x1000 maze: {seconds:.2f} s, {expanded_cells:,} expanded cells")
+    print(f"shortest path queries on 300x300: {bench_cached_queries()}")
+    print(f"locate 10x10 area in 1000x1000 (seconds): {bench_locate()}")
+    print(f"locate 10x10 areas in 1000x1000 (areas/s): {bench_locate_index()}")
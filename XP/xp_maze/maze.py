@@ -1,6 +1,22 @@
 """Maze."""
 
+import array
+import collections
 import heapq
+import math
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Cost of cells a search has not reached: more than any real path cost, whatever the cost types
+UNREACHED = math.inf
+
+# Rolling hash of areas: a polynomial of the symbols' code points, along the rows and then down the columns
+HASH_MODULUS = 2 ** 31 - 1
+HASH_ROW_BASE = 911382323
+HASH_COLUMN_BASE = 972663749
 
 class MazeSolver:
     """
@@ -43,6 +59,39 @@ class MazeSolver:
         self.start_doors = [(i, 0) for i in range(self.height) if self.maze[i][0] == '|']
         self.end_doors = [(i, self.width - 1) for i in range(self.height) if self.maze[i][self.width - 1] == '|']
 
+        # The maze compiled into a flat array of cell costs, with impassable cells (-1) all around it.
+        # Cell (y, x) is at index (y + 1) * stride + x + 1, so its neighbors are at fixed offsets from it.
+        self.stride = self.width + 2
+        self.grid = self.compile_grid()
+        self.offsets = (-self.stride, self.stride, -1, 1)  # Up, down, left, right
+
+        # Number of cells taken from the priority queue by the latest search
+        self.expanded_cells = 0
+        self.heuristic_weights = None
+        self.maze_codes = None
+        self.locate_indexes = {}
+
+    def compile_grid(self) -> array.array | list:
+        """
+        Compile the maze into a flat array of movement costs.
+
+        Every cell holds the cost from the configuration, or -1 for impassable cells.
+        The maze is surrounded by a border of impassable cells, so neighbors never have to be bounds-checked.
+        The costs are an array('i') when all of them are 32-bit integers, otherwise a list that keeps
+        the configured costs as they are, such as floats.
+
+        :return: The cost array, (height + 2) * (width + 2) cells long.
+        """
+        stride = self.stride
+        costs = {symbol: max(cost, -1) for symbol, cost in self.configs.items()}
+        compact = all(isinstance(cost, int) and cost < 2 ** 31 for cost in costs.values())
+        grid = array.array('i', [-1]) * (stride * (self.height + 2)) if compact else [-1] * (stride * (self.height + 2))
+        for y, row in enumerate(self.maze):
+            start = (y + 1) * stride + 1
+            row_costs = [costs.get(symbol, 0) for symbol in row[:self.width]]
+            grid[start:start + len(row_costs)] = array.array('i', row_costs) if compact else row_costs
+        return grid
+
     def locate(self, area: str, x: int, y: int, unknown: str = None) -> list:
         """
         Identify potential locations of a smaller known area within the larger maze.
@@ -50,6 +99,11 @@ class MazeSolver:
         The method compares the provided area to every possible location in the maze.
         If the area matches a subsection of the maze, the coordinates of the match are returned.
 
+        When NumPy is installed, all locations are compared at once with locate_vectorized(),
+        otherwise one by one with locate_with_loops(). Both return the same locations in the same order.
+        Areas without unknown cells are looked up in the index of their size instead, if build_locate_index()
+        has built one.
+
         :param area: A string representing the smaller area to locate within the maze.
         :param x: The x-coordinate of the target position relative to the area.
         :param y: The y-coordinate of the target position relative to the area.
@@ -57,6 +111,23 @@ class MazeSolver:
         :return: A list of tuples representing all potential matching coordinates (y, x).
         """
         area = [list(line) for line in area.strip().split("\n")]
+        index = self.locate_indexes.get((len(area), len(area[0])))
+        if index is not None and not any(unknown in row for row in area):
+            return self.locate_indexed(index, area, x, y)
+        if numpy is not None:
+            return self.locate_vectorized(area, x, y, unknown)
+        return self.locate_with_loops(area, x, y, unknown)
+
+    def locate_with_loops(self, area: list, x: int, y: int, unknown: str = None) -> list:
+        """
+        Locate an area by comparing it to every location of the maze, cell by cell.
+
+        :param area: The area as a list of rows, each a list of symbols.
+        :param x: The x-coordinate of the target position relative to the area.
+        :param y: The y-coordinate of the target position relative to the area.
+        :param unknown: A character representing unknown cells in the area. These cells are ignored in matching.
+        :return: A list of tuples representing all potential matching coordinates (y, x).
+        """
         area_height = len(area)
         area_width = len(area[0])
 
@@ -79,55 +150,374 @@ class MazeSolver:
 
         return possible_locations
 
-    def get_shortest_path(self, start: tuple, goal: tuple) -> tuple:
+    def locate_vectorized(self, area: list, x: int, y: int, unknown: str = None) -> list:
+        """
+        Locate an area by comparing it to all locations of the maze at once with NumPy.
+
+        The maze and the area are encoded as arrays of code points. For every known cell of the area,
+        the window of the maze seen by that cell at every location is compared to it in one array operation,
+        so the Python loop runs over the area's cells instead of over the maze's locations.
+        Unknown cells are masked out. Matches are returned row by row, like locate_with_loops() finds them.
+
+        :param area: The area as a list of rows, each a list of symbols.
+        :param x: The x-coordinate of the target position relative to the area.
+        :param y: The y-coordinate of the target position relative to the area.
+        :param unknown: A character representing unknown cells in the area. These cells are ignored in matching.
+        :return: A list of tuples representing all potential matching coordinates (y, x).
+        """
+        area_height = len(area)
+        area_width = len(area[0])
+        rows = self.height - area_height + 1
+        columns = self.width - area_width + 1
+        if rows <= 0 or columns <= 0:
+            return []
+
+        maze_codes = self.get_maze_codes()
+        matches = numpy.ones((rows, columns), dtype=bool)
+        for ai in range(area_height):
+            for aj in range(area_width):
+                symbol = area[ai][aj]
+                if symbol == unknown:
+                    continue
+                matches &= maze_codes[ai:ai + rows, aj:aj + columns] == ord(symbol)
+            if not matches.any():
+                return []
+
+        match_rows, match_columns = numpy.nonzero(matches)
+        return [(i + y, j + x) for i, j in zip(match_rows.tolist(), match_columns.tolist())]
+
+    def build_locate_index(self, area_height: int, area_width: int) -> None:
+        """
+        Build an index of every area of the given size in the maze, so locate() can look such areas up.
+
+        The index maps the rolling hash of every area of the maze to its location (i * columns + j),
+        or to a list of locations when the same hash appears more than once.
+        The hashes are computed for all locations at once with a 2-D rolling hash:
+        first over every window of area_width symbols in every row, then over every area_height of these down the columns.
+
+        :param area_height: The number of rows of the areas to index.
+        :param area_width: The number of columns of the areas to index.
+        """
+        rows = self.height - area_height + 1
+        columns = self.width - area_width + 1
+        index = {}
+        if rows > 0 and columns > 0:
+            hashes = self.get_area_hashes(area_height, area_width)
+            for location, area_hash in enumerate(hashes):
+                locations = index.setdefault(area_hash, location)
+                if locations != location:
+                    if isinstance(locations, int):
+                        index[area_hash] = [locations, location]
+                    else:
+                        locations.append(location)
+        self.locate_indexes[(area_height, area_width)] = index
+
+    def get_area_hashes(self, area_height: int, area_width: int) -> list:
+        """
+        Compute the rolling hash of the area of the given size at every location of the maze.
+
+        :param area_height: The number of rows of the areas.
+        :param area_width: The number of columns of the areas.
+        :return: The hashes of all locations, row by row.
+        """
+        rows = self.height - area_height + 1
+        columns = self.width - area_width + 1
+        if numpy is not None:
+            maze_codes = self.get_maze_codes().astype(numpy.uint64)
+            row_hashes = numpy.zeros((self.height, columns), dtype=numpy.uint64)
+            for aj in range(area_width):
+                row_hashes = (row_hashes * HASH_ROW_BASE + maze_codes[:, aj:aj + columns]) % HASH_MODULUS
+            hashes = numpy.zeros((rows, columns), dtype=numpy.uint64)
+            for ai in range(area_height):
+                hashes = (hashes * HASH_COLUMN_BASE + row_hashes[ai:ai + rows]) % HASH_MODULUS
+            return hashes.ravel().tolist()
+
+        # Without NumPy, the windows roll: the symbol leaving a window is taken out and the entering one added
+        row_shift = pow(HASH_ROW_BASE, area_width, HASH_MODULUS)
+        row_hashes = []
+        for row in self.maze:
+            codes = [ord(symbol) for symbol in row[:self.width]]
+            window_hash = 0
+            for code in codes[:area_width]:
+                window_hash = (window_hash * HASH_ROW_BASE + code) % HASH_MODULUS
+            window_hashes = [window_hash]
+            for leaving, entering in zip(codes, codes[area_width:]):
+                window_hash = (window_hash * HASH_ROW_BASE - leaving * row_shift + entering) % HASH_MODULUS
+                window_hashes.append(window_hash)
+            row_hashes.append(window_hashes)
+
+        column_shift = pow(HASH_COLUMN_BASE, area_height, HASH_MODULUS)
+        area_hashes = [0] * columns
+        for window_hashes in row_hashes[:area_height]:
+            area_hashes = [(area_hash * HASH_COLUMN_BASE + window_hash) % HASH_MODULUS
+                           for area_hash, window_hash in zip(area_hashes, window_hashes)]
+        hashes = list(area_hashes)
+        for leaving_row, entering_row in zip(row_hashes, row_hashes[area_height:]):
+            area_hashes = [(area_hash * HASH_COLUMN_BASE - leaving * column_shift + entering) % HASH_MODULUS
+                           for area_hash, leaving, entering in zip(area_hashes, leaving_row, entering_row)]
+            hashes.extend(area_hashes)
+        return hashes
+
+    def locate_indexed(self, index: dict, area: list, x: int, y: int) -> list:
+        """
+        Locate an area without unknown cells by looking its hash up in the index of its size.
+
+        Every location with the same hash is verified against the maze, so hash collisions are never returned.
+
+        :param index: The index built by build_locate_index() for the size of the area.
+        :param area: The area as a list of rows, each a list of symbols.
+        :param x: The x-coordinate of the target position relative to the area.
+        :param y: The y-coordinate of the target position relative to the area.
+        :return: A list of tuples representing all potential matching coordinates (y, x).
+        """
+        area_hash = 0
+        for row in area:
+            row_hash = 0
+            for symbol in row:
+                row_hash = (row_hash * HASH_ROW_BASE + ord(symbol)) % HASH_MODULUS
+            area_hash = (area_hash * HASH_COLUMN_BASE + row_hash) % HASH_MODULUS
+
+        locations = index.get(area_hash, [])
+        if isinstance(locations, int):
+            locations = [locations]
+
+        columns = self.width - len(area[0]) + 1
+        possible_locations = []
+        for location in locations:
+            i, j = divmod(location, columns)
+            if all(self.maze[i + ai][j:j + len(row)] == row for ai, row in enumerate(area)):
+                possible_locations.append((i + y, j + x))
+        return possible_locations
+
+    def get_maze_codes(self):
+        """
+        Get the maze as a 2-D NumPy array of the code points of its symbols, encoding it on first use.
+
+        :return: A (height, width) array of unsigned 32-bit integers.
+        """
+        if self.maze_codes is None:
+            text = "".join("".join(row[:self.width]).ljust(self.width, "\0") for row in self.maze)
+            codes = numpy.frombuffer(text.encode("utf-32-le"), dtype=numpy.uint32)
+            self.maze_codes = codes.reshape(self.height, self.width)
+        return self.maze_codes
+
+    def get_shortest_path(self, start: tuple, goal: tuple, astar: bool = False) -> tuple:
         """
         Compute the shortest path and its cost between two points in the maze.
 
         The path is calculated using Dijkstra's algorithm, which considers movement costs
         and avoids impassable cells. If no path exists, returns None and a cost of -1.
+        With astar set, the A* algorithm is used instead. It finds a path of the same cost.
 
         :param start: A tuple (y, x) representing the starting cell's coordinates.
         :param goal: A tuple (y, x) representing the goal cell's coordinates.
+        :param astar: Search with A* instead of Dijkstra's algorithm.
+        :return: A tuple containing the path as a list of coordinates and the total cost.
+        """
+        return self.get_shortest_path_between([start], [goal], astar)
+
+    def get_shortest_path_between(self, starts: list, goals: list, astar: bool = False) -> tuple:
+        """
+        Compute the cheapest path from any of the start cells to any of the goal cells.
+
+        All start cells are put into the priority queue at cost 0, so a single Dijkstra search
+        finds the cheapest of all start-goal pairs: the first goal cell taken from the queue.
+        If no path exists, returns None and a cost of -1.
+
+        The search runs on the compiled grid, where cells are numbered row by row. The queue holds (cost, cell) pairs
+        and every cell remembers the cell it was reached from, so the path is only built once, at the goal.
+
+        With astar set, the queue holds (cost + estimate, estimate, cell) entries, where the estimate is
+        the remaining cost to the nearest goal (see get_heuristic()). Cells towards the goals are expanded first,
+        and of equally promising cells the one closest to a goal. The estimate never exceeds the real cost,
+        so the found path is still the cheapest.
+
+        :param starts: A list of tuples (y, x) of the cells the path can start from.
+        :param goals: A list of tuples (y, x) of the cells the path can end in.
+        :param astar: Search with A* instead of Dijkstra's algorithm.
         :return: A tuple containing the path as a list of coordinates and the total cost.
         """
-        y_start, x_start = start
-        y_goal, x_goal = goal
+        goal, costs, parents = self.search(starts, goals, astar)
+        if goal is None:
+            return None, -1
+        return self.get_path(parents, goal), costs[goal]
+
+    def get_shortest_path_tree(self, start: tuple) -> tuple:
+        """
+        Compute the shortest paths from a start cell to every cell of the maze.
+
+        :param start: A tuple (y, x) representing the starting cell's coordinates.
+        :return: A tuple of the costs and the parents of the grid cells, as used by get_path().
+                 Cells that can not be reached cost UNREACHED.
+        """
+        _, costs, parents = self.search([start], [])
+        return costs, parents
+
+    def search(self, starts: list, goals: list, astar: bool = False) -> tuple:
+        """
+        Search the compiled grid from the start cells until a goal cell is taken from the queue.
 
-        visited = set()
-        pq = [(0, y_start, x_start, [])]  # Priority queue: (cost, y, x, path)
+        Without goals, the search goes on until every reachable cell has its final cost.
 
+        :param starts: A list of tuples (y, x) of the cells to start from.
+        :param goals: A list of tuples (y, x) of the cells to stop at.
+        :param astar: Search with A* instead of Dijkstra's algorithm.
+        :return: A tuple of the reached goal's grid cell (or None), the costs and the parents of the grid cells.
+        """
+        stride = self.stride
+        grid = self.grid
+        offsets = self.offsets
+        cell_count = len(grid)
+        row_estimates, column_estimates = self.get_heuristic(goals) if astar else (None, None)
+        goals = {(y + 1) * stride + x + 1 for y, x in goals}
+
+        # Costs stay a list, so they can be floats or grow beyond any fixed-width integer
+        costs = [UNREACHED] * cell_count
+        parents = array.array('i', [-1]) * cell_count
+        visited = bytearray(cell_count)
+
+        pq = []  # Priority queue: (cost, cell), or (cost + estimate, estimate, cell) for A*
+        for y, x in starts:
+            cell = (y + 1) * stride + x + 1
+            costs[cell] = 0
+            if astar:
+                estimate = row_estimates[y + 1] + column_estimates[x + 1]
+                pq.append((estimate, estimate, cell))
+            else:
+                pq.append((0, cell))
+        heapq.heapify(pq)
+
+        self.expanded_cells = 0
         while pq:
-            current_cost, y, x, path = heapq.heappop(pq)
+            cell = heapq.heappop(pq)[-1]
 
-            if (y, x) in visited:
+            if visited[cell]:
                 continue
+            visited[cell] = 1
+            self.expanded_cells += 1
+            current_cost = costs[cell]
+
+            if cell in goals:
+                return cell, costs, parents
+
+            for offset in offsets:
+                neighbor = cell + offset
+                move_cost = grid[neighbor]
+                if move_cost < 0:  # Impassable cell or the border
+                    continue
+                new_cost = current_cost + move_cost
+                if new_cost < costs[neighbor]:
+                    costs[neighbor] = new_cost
+                    parents[neighbor] = cell
+                    if astar:
+                        estimate = row_estimates[neighbor // stride] + column_estimates[neighbor % stride]
+                        heapq.heappush(pq, (new_cost + estimate, estimate, neighbor))
+                    else:
+                        heapq.heappush(pq, (new_cost, neighbor))
+
+        return None, costs, parents
+
+    def get_heuristic(self, goals: list) -> tuple:
+        """
+        Compute the A* estimate of the cost from every cell to the nearest of the goals.
+
+        The estimate of cell (y, x) is row_estimates[y + 1] + column_estimates[x + 1],
+        indexed like the compiled grid, so that the border rows and columns have estimates too:
+        the cheapest cost of a vertical step times the number of rows to the nearest goal row,
+        plus the cheapest cost of an inner cell times the number of inner columns to enter on the way
+        to the nearest goal column. This is the Manhattan distance weighted with the cheapest costs.
+
+        The cheapest costs come from the cells of the maze rather than from the configuration,
+        because doors and symbols missing from the configuration cost 0. Only cells that a step can enter
+        count: vertical steps can only enter cells with a passable cell above or below them,
+        and the edge columns, where the doors are, are left out of the horizontal estimate.
+        With goals on one edge, such as the end doors, the estimate is the distance to that edge.
+
+        :param goals: A list of tuples (y, x) of the goal cells.
+        :return: A tuple of the row estimates and the column estimates.
+        """
+        vertical_weight, inner_weight = self.get_heuristic_weights()
+        goal_rows = sorted({y for y, _ in goals})
+        goal_columns = sorted({x for _, x in goals})
 
-            visited.add((y, x))
-            path = path + [(y, x)]
+        def inner_columns(first: int, end: int) -> int:
+            """Count the inner columns in the range [first, end)."""
+            return max(0, min(end, self.width - 1) - max(first, 1))
 
-            if (y, x) == (y_goal, x_goal):
-                return path, current_cost
+        def columns_to_enter(x: int, goal_x: int) -> int:
+            """Count the inner columns a path from column x to column goal_x has to enter."""
+            return inner_columns(x + 1, goal_x + 1) if goal_x > x else inner_columns(goal_x, x)
 
-            for (ny, nx), move_cost in self.get_neighbors(y, x):
-                if (ny, nx) not in visited:
-                    heapq.heappush(pq, (current_cost + move_cost, ny, nx, path))
+        row_estimates = [vertical_weight * min((abs(y - goal_y) for goal_y in goal_rows), default=0)
+                         for y in range(-1, self.height + 1)]
+        column_estimates = [inner_weight * min((columns_to_enter(x, goal_x) for goal_x in goal_columns), default=0)
+                            for x in range(-1, self.width + 1)]
+        return row_estimates, column_estimates
 
-        return None, -1
+    def get_heuristic_weights(self) -> tuple:
+        """
+        Find the cheapest cost of a vertical step and the cheapest cost of an inner cell, for get_heuristic().
 
-    def solve(self) -> tuple:
+        :return: A tuple of the two costs, or zeros for mazes without such cells.
         """
-        Solve the maze by finding the shortest path from any start door to any end door.
+        if self.heuristic_weights is None:
+            grid, stride = self.grid, self.stride
+            vertical_costs = set()
+            inner_costs = set()
+            for y in range(self.height):
+                row = (y + 1) * stride
+                for cell in range(row + 1, row + self.width + 1):
+                    cost = grid[cell]
+                    if cost < 0:
+                        continue
+                    if row + 1 < cell < row + self.width:
+                        inner_costs.add(cost)
+                    if grid[cell - stride] >= 0 or grid[cell + stride] >= 0:
+                        vertical_costs.add(cost)
+            self.heuristic_weights = min(vertical_costs, default=0), min(inner_costs, default=0)
+        return self.heuristic_weights
+
+    def get_path(self, parents: array.array, cell: int) -> list:
+        """
+        Build the path to a cell by following the parents of the cells back to a start cell.
 
-        The method evaluates all possible combinations of start and end doors to find
-        the path with the lowest cost. If no path exists, returns None and a cost of -1.
+        :param parents: The grid cell each grid cell was reached from, or -1 for start cells.
+        :param cell: The grid cell the path ends in.
+        :return: The path as a list of coordinates (y, x) from the start cell to the given cell.
+        """
+        path = []
+        while cell != -1:
+            y, x = divmod(cell, self.stride)
+            path.append((y - 1, x - 1))
+            cell = parents[cell]
+        path.reverse()
+        return path
+
+    def solve(self, pairwise: bool = False, astar: bool = False) -> tuple:
+        """
+        Solve the maze by finding the shortest path from any start door to any end door.
 
+        By default all start doors are searched from at once with get_shortest_path_between(),
+        which stops at the first end door it reaches. With pairwise set, every combination of start
+        and end doors is searched separately and the path with the lowest cost is kept.
+        Both find the same lowest cost, but when several paths tie for it they can return different ones:
+        the single search returns the path to the end door it reaches first, while the pairwise search keeps
+        the first cheapest pair of doors in door order, like the original solver did.
+        If no path exists, returns None and a cost of -1.
+        With astar set, the searches use A*, which also finds the same lowest cost.
+
+        :param pairwise: Search every pair of doors separately.
+        :param astar: Search with A* instead of Dijkstra's algorithm.
         :return: A tuple containing the shortest path as a list of coordinates and the total cost.
         """
+        if not pairwise:
+            return self.get_shortest_path_between(self.start_doors, self.end_doors, astar)
+
         best_path, best_cost = None, float('inf')
 
         for start in self.start_doors:
             for goal in self.end_doors:
-                path, cost = self.get_shortest_path(start, goal)
+                path, cost = self.get_shortest_path(start, goal, astar)
                 if cost != -1 and cost < best_cost:
                     best_path, best_cost = path, cost
 
@@ -139,17 +529,87 @@ class MazeSolver:
 
         This method checks adjacent cells in all four cardinal directions (up, down, left, right).
         Only cells within the maze bounds and with non-negative movement costs are returned.
+        The costs are read from the compiled grid.
 
         :param y: The y-coordinate of the current cell.
         :param x: The x-coordinate of the current cell.
         :return: A list of tuples ((ny, nx), cost) where (ny, nx) is the neighbor's coordinates and cost is the movement cost.
         """
-        directions = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+        cell = (y + 1) * self.stride + x + 1
         neighbors = []
-        for dy, dx in directions:
-            ny, nx = y + dy, x + dx
-            if 0 <= ny < self.height and 0 <= nx < self.width:
-                cost = self.configs.get(self.maze[ny][nx], 0)
-                if cost >= 0:  # Valid cell
-                    neighbors.append(((ny, nx), cost))
+        for (dy, dx), offset in zip(((-1, 0), (1, 0), (0, -1), (0, 1)), self.offsets):
+            cost = self.grid[cell + offset]
+            if cost >= 0:  # Valid cell
+                neighbors.append(((y + dy, x + dx), cost))
         return neighbors
+
+
+class ShortestPathCache:
+    """
+    Answer many shortest path queries on one maze from cached shortest-path trees.
+
+    The first query from a start cell computes the tree of shortest paths from it to every cell.
+    Later queries from the same start only follow the parents in the tree from the goal back to the start.
+    At most max_trees trees are kept; when another one is needed, the least recently used one is dropped.
+
+    precompute_doors() computes the trees of all doors up front and keeps them besides the others,
+    so every query between doors takes time proportional to the length of its path.
+    """
+
+    def __init__(self, solver: MazeSolver, max_trees: int = 16):
+        """
+        Initialize an empty cache for the given maze solver.
+
+        :param solver: The maze solver to answer queries for.
+        :param max_trees: The maximum number of trees kept, not counting the precomputed door trees.
+        """
+        self.solver = solver
+        self.max_trees = max_trees
+        self.trees = collections.OrderedDict()
+        self.door_trees = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get_tree(self, start: tuple) -> tuple:
+        """
+        Get the shortest-path tree of a start cell, computing it if it is not cached.
+
+        :param start: A tuple (y, x) representing the starting cell's coordinates.
+        :return: A tuple of the costs and the parents of the grid cells, as returned by get_shortest_path_tree().
+        """
+        tree = self.door_trees.get(start)
+        if tree is not None:
+            self.hits += 1
+            return tree
+
+        tree = self.trees.get(start)
+        if tree is not None:
+            self.hits += 1
+            self.trees.move_to_end(start)
+            return tree
+
+        self.misses += 1
+        tree = self.trees[start] = self.solver.get_shortest_path_tree(start)
+        if len(self.trees) > self.max_trees:
+            self.trees.popitem(last=False)
+        return tree
+
+    def get_shortest_path(self, start: tuple, goal: tuple) -> tuple:
+        """
+        Compute the shortest path and its cost between two points in the maze, like MazeSolver.get_shortest_path().
+
+        :param start: A tuple (y, x) representing the starting cell's coordinates.
+        :param goal: A tuple (y, x) representing the goal cell's coordinates.
+        :return: A tuple containing the path as a list of coordinates and the total cost.
+        """
+        costs, parents = self.get_tree(start)
+        cell = (goal[0] + 1) * self.solver.stride + goal[1] + 1
+        if costs[cell] == UNREACHED:
+            return None, -1
+        return self.solver.get_path(parents, cell), costs[cell]
+
+    def precompute_doors(self) -> None:
+        """Compute and keep the trees of all start and end doors."""
+        for door in self.solver.start_doors + self.solver.end_doors:
+            if door not in self.door_trees:
+                self.door_trees[door] = self.trees.pop(door, None) or self.solver.get_shortest_path_tree(door)